@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import argparse
+import random
+import time
+
+# DBpedia Indexer imports
+import record
+
+SIZES = [100, 1000, 10000, 100000]
+QUADRATIC_MAX = 10000
+
+
+def clean_labels_quadratic(cand, pref_label):
+    '''
+    Previous implementation of record.clean_labels, for comparison.
+    '''
+    alt_label = []
+
+    # Exclude some unwanted candidates
+    unwanted = ['/', '|']
+    for s in unwanted:
+        for c in cand[:]:
+            if c and c.find(s) > -1:
+                cand.remove(c)
+
+    # Exclude identical alt labels and alt labels identical to the pref label
+    alt_label = []
+    for l in cand:
+        l_norm = record.normalize(record.remove_spec(l))
+        if l_norm and l_norm != pref_label:
+            if l_norm not in alt_label:
+                alt_label.append(l_norm)
+
+    # Exclude alt labels that contain the same words as the pref label
+    for l in alt_label[:]:
+        if len(set(l.split()) & set(pref_label.split())) == len(l.split()):
+            if len(pref_label.split()) == len(l.split()):
+                alt_label.remove(l)
+
+    return alt_label
+
+
+def get_candidates(n, pref_label, seed=0):
+    '''
+    Generate n synthetic candidate labels resembling the redirects and
+    aliases of a popular entity: a mix of distinct and repeated labels,
+    labels with a specification, unwanted labels and reorderings of the
+    pref label.
+    '''
+    rnd = random.Random(seed)
+    words = pref_label.split()
+    cand = []
+
+    for i in range(n):
+        r = rnd.random()
+        if r < 0.4:
+            cand.append('{} {}'.format(rnd.choice(words), i))
+        elif r < 0.6 and cand:
+            cand.append(rnd.choice(cand))
+        elif r < 0.7:
+            cand.append('{} ({})'.format(pref_label, i % 100))
+        elif r < 0.8:
+            cand.append('{}/{}'.format(rnd.choice(words), i))
+        elif r < 0.9:
+            cand.append(' '.join(reversed(words)))
+        else:
+            cand.append('Label {} {}'.format(i, rnd.choice(words)))
+
+    return cand
+
+
+def bench(func, cand, pref_label):
+    '''
+    Time a single call of a clean labels function on a copy of the
+    candidates, with empty normalization caches.
+    '''
+    record.normalize.cache_clear()
+    start = time.perf_counter()
+    result = func(list(cand), pref_label)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--sizes', required=False, type=int, nargs='+',
+                        default=SIZES, help='numbers of candidates')
+    parser.add_argument('--quadratic-max', required=False, type=int,
+                        default=QUADRATIC_MAX,
+                        help='largest size to time the previous '
+                        'implementation for')
+
+    args = parser.parse_args()
+
+    pref_label = 'albert einstein'
+
+    for n in vars(args)['sizes']:
+        cand = get_candidates(n, pref_label)
+        t, result = bench(record.clean_labels, cand, pref_label)
+        line = '{:>7} candidates: {:8.3f} s'.format(n, t)
+
+        if n <= vars(args)['quadratic_max']:
+            t_old, result_old = bench(clean_labels_quadratic, cand,
+                                      pref_label)
+            assert result == result_old, 'Output differs for {}'.format(n)
+            line += ', previously {:8.3f} s'.format(t_old)
+
+        print(line)
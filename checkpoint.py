@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import collections
+import os
+import tempfile
+import threading
+
+
+class Checkpoint(object):
+    '''
+    Progress journal for an input list, holding the byte offset just past
+    the last line whose document was committed to Solr, its line number
+    and its uri. Positions handed out to concurrent workers are tracked
+    in order, so that the journal never moves past a position that has
+    not been acknowledged yet.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = collections.deque()
+        self.acked = set()
+        self.offset, self.line, self.uri = self.load()
+        self.last = None
+        self.saved = None
+
+    def load(self):
+        '''
+        Read the last saved position, if any.
+        '''
+        if not os.path.exists(self.path):
+            return 0, -1, None
+        with open(self.path, 'rb') as fh:
+            offset, line, uri = fh.read().decode('utf-8').rstrip(
+                '\n').split('\t')
+        return int(offset), int(line), uri
+
+    def add(self, position):
+        '''
+        Register an (offset, line, uri) position that has been handed out
+        for processing.
+        '''
+        with self.lock:
+            self.pending.append(position)
+
+    def ack(self, position):
+        '''
+        Acknowledge that all lines up to a registered position have been
+        sent to Solr.
+        '''
+        with self.lock:
+            self.acked.add(position)
+            while self.pending and self.pending[0] in self.acked:
+                self.last = self.pending.popleft()
+                self.acked.remove(self.last)
+
+    def position(self):
+        '''
+        Return the last position up to which all lines have been
+        acknowledged.
+        '''
+        with self.lock:
+            return self.last
+
+    def save(self, position):
+        '''
+        Durably write a position to the journal, replacing the previous
+        one. Call this only after the documents up to the position have
+        been committed. A position before the last one saved is ignored,
+        as concurrent loaders may commit in any order.
+        '''
+        if not position:
+            return
+        offset, line, uri = position
+
+        with self.lock:
+            if self.saved and line <= self.saved[1]:
+                return
+
+            fd, tmp_path = tempfile.mkstemp(
+                prefix=os.path.basename(self.path) + '.',
+                dir=os.path.dirname(os.path.abspath(self.path)))
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write('{}\t{}\t{}\n'.format(offset, line, uri).encode(
+                    'utf-8'))
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, self.path)
+            self.offset, self.line, self.uri = position
+            self.saved = position
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import threading
+import urllib.parse
+
+# Third-party library imports
+import requests
+
+POOL_SIZE = 10
+TIMEOUT = 300
+
+sessions = {}
+sessions_lock = threading.Lock()
+
+
+def configure(pool_size=None, timeout=None):
+    '''
+    Set the connection pool size per host and the default timeout in
+    seconds. Sessions created before are closed.
+    '''
+    global POOL_SIZE, TIMEOUT
+
+    if pool_size:
+        POOL_SIZE = pool_size
+    if timeout:
+        TIMEOUT = timeout
+
+    with sessions_lock:
+        for session in sessions.values():
+            session.close()
+        sessions.clear()
+
+
+def get_session(url):
+    '''
+    Return the shared session for the host of the url, keeping a pool of
+    persistent connections to that host.
+    '''
+    parts = urllib.parse.urlsplit(url)
+    host = parts.scheme + '://' + parts.netloc
+
+    with sessions_lock:
+        if host not in sessions:
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=POOL_SIZE, pool_block=True)
+            session = requests.Session()
+            session.mount(host, adapter)
+            sessions[host] = session
+        return sessions[host]
+
+
+def get(url, **kwargs):
+    '''
+    Send a GET request over a pooled connection, with the default timeout
+    unless another one is specified.
+    '''
+    kwargs.setdefault('timeout', TIMEOUT)
+    return get_session(url).get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    '''
+    Send a POST request over a pooled connection, with the default timeout
+    unless another one is specified.
+    '''
+    kwargs.setdefault('timeout', TIMEOUT)
+    return get_session(url).post(url, **kwargs)
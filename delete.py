@@ -21,43 +21,135 @@
 
 # Standard library imports
 import json
-import time
 
-# Third-party library imports
-import requests
+# DBpedia Indexer imports
+import client
+import extsort
+import uridict
 
 
 SOLR_UPDATE_URL = 'http://linksolr1.kbresearch.nl/dbpedia/update'
 
+DELETE_BATCH = 1000
+STATUSES = ['added', 'removed', 'unchanged']
 
-def delete_list(new_f, old_f):
+
+def sorted_uris(in_file, tmp_dir=None):
     '''
-    Delete Solr document for each URI on the old list that is no longer
-    present on the new list.
+    Yield the distinct uris on a plain text list in sorted order, sorting
+    with bounded memory.
+    '''
+    prev = None
+    for uri in extsort.sort_lines(uridict.read_list(in_file), tmp_dir):
+        if uri != prev:
+            yield uri
+        prev = uri
+
+
+def diff_lists(new_f, old_f, tmp_dir=None):
+    '''
+    Compare two uri lists by merging their sorted streams. Yield (status,
+    uri) pairs, where the status is added for uris only on the new list,
+    removed for uris only on the old list and unchanged for uris on both.
+    Uris are newline terminated byte strings.
+    '''
+    new = sorted_uris(new_f, tmp_dir)
+    old = sorted_uris(old_f, tmp_dir)
+    n = next(new, None)
+    o = next(old, None)
+
+    while n is not None or o is not None:
+        if o is None or (n is not None and n < o):
+            yield 'added', n
+            n = next(new, None)
+        elif n is None or o < n:
+            yield 'removed', o
+            o = next(old, None)
+        else:
+            yield 'unchanged', n
+            n = next(new, None)
+            o = next(old, None)
+
+
+def diff_path(prefix, status):
+    return '{}.{}.txt'.format(prefix, status)
+
+
+def write_diff(new_f, old_f, prefix, tmp_dir=None):
+    '''
+    Write the added, removed and unchanged uris to separate files starting
+    with prefix. Return the number of uris of each status.
     '''
-    with open(new_f, 'rb') as fh:
-        new_list = fh.read().decode('utf-8').split()
-        print(len(new_list))
+    counts = dict([(status, 0) for status in STATUSES])
+    handles = dict([(status, open(diff_path(prefix, status), 'wb')) for
+                    status in STATUSES])
+
+    try:
+        for status, uri in diff_lists(new_f, old_f, tmp_dir):
+            handles[status].write(uri)
+            counts[status] += 1
+    finally:
+        for fh in handles.values():
+            fh.close()
 
-    with open(old_f, 'rb') as fh:
-        old_list = fh.read().decode('utf-8').split()
-        print(len(old_list))
+    return counts
 
-    diff = list(set(old_list) - set(new_list))
 
-    for i, uri in enumerate(diff):
-        payload = json.dumps({'delete': uri},
+def delete_uris(uris, batch_size=DELETE_BATCH):
+    '''
+    Delete the Solr documents for the uris in batches of batch_size ids
+    per request, followed by a single commit. Return the number of uris
+    in batches that were rejected.
+    '''
+    headers = {'Content-Type': 'application/json'}
+    failed = 0
+
+    def send(batch):
+        payload = json.dumps({'delete': batch},
                              ensure_ascii=False).encode('utf-8')
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(SOLR_UPDATE_URL, data=payload,
-                                 headers=headers)
-
-        if i % 100 == 0 or i == len(diff) - 1:
-            print('Processed {} of {}'.format(i, len(diff)))
-            print('Committing changes...')
-            resp = requests.get(SOLR_UPDATE_URL + '?commit=true')
-            print(resp.text)
-            time.sleep(1)
+        try:
+            resp = client.post(SOLR_UPDATE_URL, data=payload,
+                               headers=headers).json()
+            if resp['responseHeader']['status'] == 0:
+                return 0
+        except Exception as e:
+            pass
+        print('Delete failed for batch starting with {}'.format(batch[0]))
+        return len(batch)
+
+    batch = []
+    for i, uri in enumerate(uris):
+        batch.append(uri)
+        if len(batch) >= batch_size:
+            failed += send(batch)
+            batch = []
+            print('Processed {} uris'.format(i + 1))
+    if batch:
+        failed += send(batch)
+
+    print('Committing changes...')
+    resp = client.get(SOLR_UPDATE_URL + '?commit=true')
+    print(resp.text)
+
+    return failed
+
+
+def delete_list(new_f, old_f, batch_size=DELETE_BATCH):
+    '''
+    Delete Solr document for each URI on the old list that is no longer
+    present on the new list. The added, removed and unchanged URIs are
+    written next to the new list.
+    '''
+    prefix = new_f.rsplit('.', 1)[0]
+    counts = write_diff(new_f, old_f, prefix)
+    print(counts)
+
+    with open(diff_path(prefix, 'removed'), 'rb') as fh:
+        uris = (line.rstrip(b'\n').decode('utf-8') for line in fh)
+        failed = delete_uris(uris, batch_size)
+
+    print('Deleted {} of {}'.format(counts['removed'] - failed,
+                                    counts['removed']))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import argparse
+import collections
+import dbm
+import itertools
+import json
+import multiprocessing
+import os
+import pprint
+import re
+import sys
+
+# DBpedia Indexer imports
+import extsort
+import record
+
+CHUNK_SIZE = 256 * 1024 * 1024
+WORKERS = multiprocessing.cpu_count()
+
+# Object namespaces kept for outgoing triples, as in record.get_records
+NAMESPACES = ['http://dbpedia.org', 'http://www.wikidata.org/entity',
+              'http://nl.dbpedia.org', 'http://schema.org']
+
+TRIPLE = re.compile(r'^<([^>]*)> <([^>]*)> (.*) \.\s*$')
+ESCAPE = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+ESCAPES = {'t': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f'}
+
+
+def unescape(match):
+    '''
+    Replace an N-Triples escape sequence by the character it stands for.
+    '''
+    if match.group(3) is not None:
+        return ESCAPES.get(match.group(3), match.group(3))
+    return chr(int(match.group(1) or match.group(2), 16))
+
+
+def parse_triple(line):
+    '''
+    Parse an N-Triples line into a (subject, predicate, object, literal)
+    tuple. Return None for comments, blank nodes and malformed lines.
+    '''
+    match = TRIPLE.match(line)
+    if not match:
+        return None
+
+    s, p, o = match.groups()
+
+    if o.startswith('<') and o.endswith('>'):
+        return s, p, o[1:-1], False
+
+    if o.startswith('"'):
+        o = o[1:o.rindex('"')]
+        return s, p, ESCAPE.sub(unescape, o), True
+
+    return None
+
+
+def get_chunks(paths, chunk_size=CHUNK_SIZE):
+    '''
+    Split the dump files into (path, start, end) byte ranges.
+    '''
+    chunks = []
+    for path in paths:
+        size = os.path.getsize(path)
+        for start in range(0, size, chunk_size):
+            chunks.append((path, start, min(start + chunk_size, size)))
+    return chunks
+
+
+def read_chunk(path, start, end):
+    '''
+    Yield the lines starting within the byte range of a dump file.
+    '''
+    with open(path, 'rb') as fh:
+        # Skip the line that started in the previous chunk, if any
+        if start:
+            fh.seek(start - 1)
+            fh.readline()
+        while fh.tell() < end:
+            line = fh.readline()
+            if not line:
+                break
+            yield line
+
+
+def get_rows(lines):
+    '''
+    Turn dump lines into sortable rows keyed by the uri of the record they
+    belong to. Outgoing triples are kept for the subject, redirects and
+    disambiguations are kept for the object as well, and links only
+    contribute to the inlink count of the object.
+    '''
+    inlinks = collections.Counter()
+
+    for line in lines:
+        triple = parse_triple(line.decode('utf-8'))
+        if not triple:
+            continue
+
+        s, p, o, literal = triple
+
+        if literal or any([n in o for n in NAMESPACES]):
+            yield s, 'out', p, o
+
+        if p in [record.PROP_REDIRECT, record.PROP_DISAMBIGUATES]:
+            yield o, 'in', p, s
+        elif p == record.PROP_LINK:
+            inlinks[o] += 1
+
+    for o, count in inlinks.items():
+        yield o, 'count', 'inlinks', count
+
+
+def row_key(line):
+    '''
+    Sort key of a row line, i.e. the uri of the record.
+    '''
+    return line.split(b'\t', 1)[0]
+
+
+def sort_chunk(args):
+    '''
+    Read a chunk of a dump file and write its rows to sorted run files.
+    '''
+    path, start, end, tmp_dir = args
+    lines = (s.encode('utf-8') + b'\t' +
+             json.dumps([kind, p, v], ensure_ascii=False).encode('utf-8') +
+             b'\n' for s, kind, p, v in get_rows(read_chunk(path, start,
+                                                            end)))
+    return extsort.sort_runs(lines, tmp_dir, row_key)
+
+
+def group_records(lines):
+    '''
+    Group sorted row lines into (uri, record) pairs, with the records in
+    the format produced by record.get_records.
+    '''
+    for uri, group in itertools.groupby(lines, key=row_key):
+        rec = {}
+        inbound = {}
+        inlinks = 0
+
+        for line in group:
+            kind, p, v = json.loads(line.split(b'\t', 1)[1].decode('utf-8'))
+            if kind == 'count':
+                inlinks += v
+                continue
+            target = rec if kind == 'out' else inbound
+            if p in target:
+                target[p].append(v)
+            else:
+                target[p] = [v]
+
+        rec.update(inbound)
+        rec['inlinks'] = [inlinks]
+
+        rec = record.collapse(rec, [record.PROP_ABSTRACT,
+                                    record.PROP_COMMENT])
+        rec = record.collapse(rec, [record.PROP_NAME, record.PROP_BIRTH_NAME,
+                                    record.PROP_GIVEN_NAME,
+                                    record.PROP_LONG_NAME, record.PROP_ALIAS,
+                                    record.PROP_NICK_NAME])
+
+        yield uri.decode('utf-8'), rec
+
+
+def iter_records(paths, workers=WORKERS, chunk_size=CHUNK_SIZE,
+                 tmp_dir=None):
+    '''
+    Stream the dump files in parallel byte range chunks and yield a
+    (uri, record) pair for every uri, in sorted uri order.
+    '''
+    chunks = [c + (tmp_dir,) for c in get_chunks(paths, chunk_size)]
+
+    # Keep the runs in chunk order, so values stay in dump file order
+    with multiprocessing.Pool(workers) as pool:
+        runs = [r for chunk_runs in pool.map(sort_chunk, chunks)
+                for r in chunk_runs]
+
+    return group_records(extsort.merge_runs(runs, row_key))
+
+
+def build(paths, out_file, workers=WORKERS, chunk_size=CHUNK_SIZE,
+          tmp_dir=None):
+    '''
+    Build a record store from the dump files, mapping each uri to its
+    JSON encoded record.
+    '''
+    with dbm.open(out_file, 'n') as db:
+        for i, (uri, rec) in enumerate(iter_records(paths, workers,
+                                                    chunk_size, tmp_dir)):
+            if i % 100000 == 0:
+                print('Storing record {}: {}'.format(i, uri))
+            db[uri.encode('utf-8')] = json.dumps(rec, ensure_ascii=False)
+
+
+def open_store(path):
+    '''
+    Open a record store for reading.
+    '''
+    return dbm.open(path, 'r')
+
+
+def get_dump_paths(list_file='dumps.txt', dump_dir='.'):
+    '''
+    Read the names of the dump files to be processed from a list file.
+    '''
+    with open(list_file, 'rb') as fh:
+        names = fh.read().decode('utf-8').split()
+    return [os.path.join(dump_dir, n) for n in names]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--dumps', required=False, type=str,
+                        default='dumps.txt', help='path to dump list file')
+    parser.add_argument('--dir', required=False, type=str,
+                        default='.', help='directory containing the dumps')
+    parser.add_argument('--output', required=False, type=str,
+                        default='records.db', help='path to record store')
+    parser.add_argument('--workers', required=False, type=int,
+                        default=WORKERS, help='number of parser processes')
+    parser.add_argument('--chunk-size', required=False, type=int,
+                        default=CHUNK_SIZE, help='chunk size in bytes')
+    parser.add_argument('--tmp', required=False, type=str,
+                        default=None, help='directory for sorted runs')
+    parser.add_argument('--show', required=False, type=str,
+                        default=None, help='print the stored record for uri')
+
+    args = parser.parse_args()
+
+    if vars(args)['show']:
+        with open_store(vars(args)['output']) as db:
+            pprint.pprint(json.loads(db[vars(args)['show'].encode('utf-8')]))
+        sys.exit()
+
+    build(get_dump_paths(vars(args)['dumps'], vars(args)['dir']),
+          vars(args)['output'], vars(args)['workers'],
+          vars(args)['chunk_size'], vars(args)['tmp'])
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import argparse
+import os
+import sys
+import tempfile
+
+# Third-party library imports
+import numpy as np
+
+# DBpedia Indexer imports
+import client
+import uridict
+
+W2V_URL = 'http://kbresearch.nl/word2vec/vectors?'
+
+# Embedding store built by this module, used instead of the word2vec web
+# service when set
+STORE = None
+
+
+def read_vectors(in_file):
+    '''
+    Yield (key, values) pairs from an exported vector file in word2vec
+    text format, skipping the optional header line.
+    '''
+    with open(in_file, 'rb') as fh:
+        for i, line in enumerate(fh):
+            parts = line.split()
+            if i == 0 and len(parts) == 2:
+                continue
+            if len(parts) > 1:
+                yield parts[0], parts[1:]
+
+
+def build(in_file, out_prefix, tmp_dir=None):
+    '''
+    Build an embedding store from an exported vector file: a uri
+    dictionary of the keys, whose ids are the row numbers, and a float32
+    matrix with the vectors.
+    '''
+    fd, keys_file = tempfile.mkstemp(suffix='.keys', dir=tmp_dir)
+    dim = 0
+    with os.fdopen(fd, 'wb') as fh:
+        for key, values in read_vectors(in_file):
+            fh.write(key + b'\n')
+            dim = len(values)
+
+    uridict.build([keys_file], out_prefix + '.dict', tmp_dir)
+    os.remove(keys_file)
+    keys = uridict.open_dict(out_prefix + '.dict')
+
+    matrix = np.lib.format.open_memmap(out_prefix + '.npy', mode='w+',
+                                       dtype=np.float32,
+                                       shape=(len(keys), dim))
+    for key, values in read_vectors(in_file):
+        matrix[keys.id(key.decode('utf-8'))] = np.array(values,
+                                                        dtype=np.float32)
+    matrix.flush()
+
+    print('Stored {} vectors of dimension {}'.format(len(keys), dim))
+
+
+class EmbeddingStore(object):
+    '''
+    Read-only embedding store, with the vectors in a memory-mapped float32
+    matrix and the keys in a uri dictionary giving their row numbers.
+    '''
+
+    def __init__(self, prefix):
+        self.keys = uridict.open_dict(prefix + '.dict')
+        self.matrix = np.load(prefix + '.npy', mmap_mode='r')
+
+    def lookup(self, keys):
+        '''
+        Return a matrix with the vectors for the keys that are in the
+        store, in the order of the keys.
+        '''
+        rows = [self.keys.id(k) for k in keys]
+        return self.matrix[[r for r in rows if r is not None]]
+
+    def get_vectors(self, source):
+        '''
+        Return the vectors for the space separated keys in the source
+        string, as the word2vec web service does.
+        '''
+        return self.lookup(source.split()).astype(np.float64).tolist()
+
+
+def open_store(prefix):
+    '''
+    Open an embedding store for lookups.
+    '''
+    return EmbeddingStore(prefix)
+
+
+def get_vectors(source):
+    '''
+    Return the vectors for the space separated keys in the source string,
+    i.e. a Wikidata id or a list of tokens, from the embedding store if
+    available or else from the word2vec web service.
+    '''
+    if STORE is not None:
+        return STORE.get_vectors(source)
+
+    payload = {'source': source}
+    response = client.get(W2V_URL, params=payload, timeout=300)
+    return response.json()['vectors']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--vectors', required=False, type=str,
+                        default=None, help='path to exported vector file')
+    parser.add_argument('--output', required=False, type=str,
+                        default='embeddings', help='embedding store prefix')
+    parser.add_argument('--tmp', required=False, type=str,
+                        default=None, help='directory for sorted runs')
+    parser.add_argument('--show', required=False, type=str,
+                        default=None, help='print the vectors for source')
+
+    args = parser.parse_args()
+
+    if vars(args)['show']:
+        STORE = open_store(vars(args)['output'])
+        print(get_vectors(vars(args)['show']))
+        sys.exit()
+
+    if not vars(args)['vectors']:
+        parser.print_help()
+        sys.exit(1)
+
+    build(vars(args)['vectors'], vars(args)['output'], vars(args)['tmp'])
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import heapq
+import os
+import tempfile
+
+RUN_LINES = 1000000
+
+
+def write_run(lines, tmp_dir=None, key=None):
+    '''
+    Sort a list of newline terminated byte strings and write them to a
+    temporary run file. Return the path of the run file.
+    '''
+    lines.sort(key=key)
+    fd, path = tempfile.mkstemp(suffix='.run', dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as fh:
+        fh.writelines(lines)
+    return path
+
+
+def sort_runs(lines, tmp_dir=None, key=None, run_lines=RUN_LINES):
+    '''
+    Split an iterable of newline terminated byte strings into sorted run
+    files of at most run_lines lines each. Return the paths of the runs.
+    '''
+    runs = []
+    buf = []
+    for line in lines:
+        buf.append(line)
+        if len(buf) >= run_lines:
+            runs.append(write_run(buf, tmp_dir, key))
+            buf = []
+    if buf:
+        runs.append(write_run(buf, tmp_dir, key))
+    return runs
+
+
+def merge_runs(runs, key=None, remove=True):
+    '''
+    Merge sorted run files into a single sorted stream of lines. Lines with
+    equal keys come out in the order of the runs. The run files are
+    removed afterwards unless remove is False.
+    '''
+    handles = [open(path, 'rb') for path in runs]
+    try:
+        for line in heapq.merge(*handles, key=key):
+            yield line
+    finally:
+        for fh in handles:
+            fh.close()
+        if remove:
+            for path in runs:
+                os.remove(path)
+
+
+def sort_lines(lines, tmp_dir=None, key=None, run_lines=RUN_LINES):
+    '''
+    Sort an iterable of newline terminated byte strings with bounded
+    memory, yielding the sorted lines.
+    '''
+    return merge_runs(sort_runs(lines, tmp_dir, key, run_lines), key)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import argparse
+import dbm
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+
+# Hash seeds to check fingerprint stability with
+SEEDS = ['0', '1', '2', '3', '4']
+
+
+def canonical(value):
+    '''
+    Return a copy of a document or field value with the contents of all
+    lists sorted, as the order of list fields built from sets is not
+    meaningful and may differ between processes.
+    '''
+    if isinstance(value, dict):
+        return dict([(k, canonical(v)) for k, v in value.items()])
+    if isinstance(value, list):
+        return sorted([canonical(v) for v in value],
+                      key=lambda v: json.dumps(v, sort_keys=True))
+    return value
+
+
+def fingerprint(doc):
+    '''
+    Hash the canonical JSON serialization of a document.
+    '''
+    data = json.dumps(canonical(doc), ensure_ascii=False, sort_keys=True,
+                      separators=(',', ':'))
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).digest()
+
+
+class FingerprintStore(object):
+    '''
+    Persistent id to document fingerprint store for incremental indexing.
+    Fingerprints of new and changed documents are kept pending until Solr
+    has accepted the documents, and only saved once they are committed,
+    so that documents lost along the way are sent again on the next run.
+    The ids of saved new and changed documents are appended to a changes
+    file.
+    '''
+
+    def __init__(self, path, changes_path=None):
+        self.db = dbm.open(path, 'c')
+        self.changes = open(changes_path or path + '.changes', 'a',
+                            encoding='utf-8')
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.acked = {}
+        self.counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'failed': 0}
+
+    def check(self, uri, doc):
+        '''
+        Check whether the document for the id is new or has changed since
+        it was last indexed, in which case its fingerprint is kept pending.
+        '''
+        fp = fingerprint(doc)
+        key = uri.encode('utf-8')
+
+        with self.lock:
+            old = self.db.get(key)
+            if old == fp:
+                self.counts['unchanged'] += 1
+                return False
+
+            self.pending[uri] = ('changed' if old else 'new', fp)
+            return True
+
+    def ack(self, uris, failed=[]):
+        '''
+        Mark the pending fingerprints for the ids as accepted by Solr, or
+        drop them for those that were rejected.
+        '''
+        with self.lock:
+            for uri in uris:
+                if uri in self.pending:
+                    self.acked[uri] = self.pending.pop(uri)
+            for uri in failed:
+                if uri in self.pending:
+                    del self.pending[uri]
+                    self.counts['failed'] += 1
+
+    def take(self):
+        '''
+        Return and clear the accepted fingerprints, to be saved once they
+        have been committed.
+        '''
+        with self.lock:
+            acked = self.acked
+            self.acked = {}
+        return acked
+
+    def save(self, acked):
+        '''
+        Save fingerprints returned by take and record the changes.
+        '''
+        with self.lock:
+            for uri, (status, fp) in acked.items():
+                self.db[uri.encode('utf-8')] = fp
+                self.changes.write('{}\t{}\n'.format(status, uri))
+                self.counts[status] += 1
+            self.changes.flush()
+            if hasattr(self.db, 'sync'):
+                self.db.sync()
+
+    def write_summary(self, path):
+        '''
+        Write the number of new, changed, unchanged and failed documents.
+        '''
+        with open(path, 'w', encoding='utf-8') as fh:
+            for status in ['new', 'changed', 'unchanged', 'failed']:
+                fh.write('{}\t{}\n'.format(status, self.counts[status]))
+        return self.counts
+
+    def close(self):
+        self.changes.close()
+        self.db.close()
+
+
+def open_store(path, changes_path=None):
+    '''
+    Open a fingerprint store for incremental indexing.
+    '''
+    return FingerprintStore(path, changes_path)
+
+
+def get_fingerprint(uri, records=None):
+    '''
+    Build the full document for the URI and return its fingerprint as a
+    hex string, reading the records from a record store if given.
+    '''
+    import dumps
+    import record
+
+    if records:
+        record.RECORD_STORE = dumps.open_store(records)
+    return fingerprint(record.get_document(uri)).hex()
+
+
+def check(uri, records=None, seeds=SEEDS):
+    '''
+    Build the fingerprint of the document for the URI in separate
+    processes with different string hash seeds. Return the distinct
+    fingerprints, of which there should be exactly one.
+    '''
+    cmd = [sys.executable, os.path.realpath(__file__), '--fingerprint',
+           uri]
+    if records:
+        cmd += ['--records', records]
+
+    fps = set()
+    for seed in seeds:
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        fps.add(subprocess.check_output(cmd, env=env).decode('ascii').strip())
+    return fps
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('store', type=str, nargs='?', default=None,
+                        help='path to fingerprint store')
+    parser.add_argument('--fingerprint', required=False, type=str,
+                        default=None,
+                        help='print the fingerprint of the document for uri')
+    parser.add_argument('--check', required=False, type=str,
+                        default=None,
+                        help='check that the fingerprint of the document '
+                        'for uri is the same with different hash seeds')
+    parser.add_argument('--records', required=False, type=str,
+                        default=None,
+                        help='path to record store to build documents from')
+
+    args = parser.parse_args()
+
+    if vars(args)['fingerprint']:
+        print(get_fingerprint(vars(args)['fingerprint'],
+                              vars(args)['records']))
+    elif vars(args)['check']:
+        fps = check(vars(args)['check'], vars(args)['records'])
+        print('{} distinct fingerprints for {} hash seeds'.format(
+            len(fps), len(SEEDS)))
+        sys.exit(0 if len(fps) == 1 else 1)
+    elif vars(args)['store']:
+        db = dbm.open(vars(args)['store'], 'r')
+        print('{} fingerprints in {}'.format(len(db), vars(args)['store']))
+    else:
+        parser.print_help()
+        sys.exit(1)
@@ -20,15 +20,24 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import requests
+
+import sparql
+import uridict
 
 VIRTUOSO_URL = 'http://openvirtuoso.kbresearch.nl/sparql?'
 DEFAULT_GRAPH_URI = 'http://nl.dbpedia.org'
 
+BUFFER_SIZE = 1024 * 1024
+
+# Number of uris per page, kept below the maximum number of sorted rows
+# Virtuoso returns for a query (MaxSortedTopRows, ResultSetMaxRows)
+PAGE_SIZE = 10000
 
-def get_uris(lang='nl'):
+
+def get_uris(lang='nl', page_size=PAGE_SIZE):
     '''
-    Retrieve all relevant resource uris for specified language.
+    Retrieve all relevant resource uris for specified language, in pages
+    of at most page_size uris.
     '''
     if lang == 'nl':
         query = '''
@@ -49,6 +58,7 @@ def get_uris(lang='nl'):
             MINUS {
                 ?s <http://dbpedia.org/ontology/wikiPageRedirects> ?u .
             }
+            %(after)s
         }
         '''
     else:
@@ -74,50 +84,78 @@ def get_uris(lang='nl'):
                 ?t <http://www.w3.org/2002/07/owl#sameAs> ?s .
                 ?t <http://www.w3.org/2000/01/rdf-schema#label> ?w .
             }
+            %(after)s
         }
         '''
 
     query = ' '.join(query.split())
 
-    count_query = query.replace('DISTINCT ?s', 'count(DISTINCT ?s) as ?count')
-    payload = {
-        'default-graph-uri': DEFAULT_GRAPH_URI,
-        'format': 'json',
-        'query': count_query
-        }
-
-    response = requests.get(VIRTUOSO_URL, params=payload)
+    # Page through the subjects in order, each page starting after the
+    # last subject of the previous one. A short page does not mean that
+    # all subjects have been retrieved, as the server may cap the number
+    # of rows, so continue until a page is empty.
+    last = None
+    while True:
+        print('Retrieving batch after: ' + str(last))
+        after = ''
+        if last is not None:
+            after = 'FILTER(STR(?s) > "%s")' % escape(last)
+        page_query = query % {'after': after}
+        page_query += ' ORDER BY STR(?s) LIMIT ' + str(page_size)
 
-    count = int(response.json().get('results').get('bindings')[0].get(
-        'count').get('value'))
-    print('Total number of records found: {}'.format(count))
+        # Write the uris to file while they are being received
+        bindings = sparql.select(VIRTUOSO_URL, page_query, DEFAULT_GRAPH_URI)
+        count, page_last = save_uris((b.get('s') for b in bindings), lang)
 
-    limit = 1000000
-    offset = 0
-    while offset < count:
-        print('Retrieving batch with offset: ' + str(offset))
-        payload['query'] = query + ' LIMIT ' + str(limit)
-        payload['query'] += ' OFFSET ' + str(offset)
-        response = requests.get(VIRTUOSO_URL, params=payload)
-        save_uris(response.json(), lang)
-        offset += limit
+        if count == 0:
+            break
+        last = page_last
 
 
-def save_uris(record, lang='nl'):
+def escape(s):
     '''
-    Save uris to plain text file, one uri per line.
+    Escape a string for use in a SPARQL string literal.
     '''
-    batch_len = len(record.get('results').get('bindings'))
-    print('Saving batch of length: {}'.format(batch_len))
+    return s.replace('\\', '\\\\').replace('"', '\\"')
+
 
+def save_uris(uris, lang='nl'):
+    '''
+    Save uris to plain text file, one uri per line, writing in buffered
+    chunks. Return the number of uris saved and the last one.
+    '''
     filename = 'uris_' + lang + '.txt'
     mode = 'ab' if os.path.exists(filename) else 'wb'
-    with open(filename, mode) as fh:
-        for triple in record.get('results').get('bindings'):
-            fh.write(triple.get('s').get('value').encode('utf-8') +
-                     '\n'.encode('utf-8'))
+
+    count = 0
+    last = None
+    with open(filename, mode, buffering=BUFFER_SIZE) as fh:
+        for uri in uris:
+            fh.write(uri.encode('utf-8') + b'\n')
+            count += 1
+            last = uri
+
+    print('Saved batch of length: {}'.format(count))
+    return count, last
+
+
+def encode_uris(langs=['nl', 'en'], dict_file='uris.dict'):
+    '''
+    Add the uris on the lists for the specified languages to the uri
+    dictionary and save each list as an array of uri ids as well. Known
+    uris keep their ids, so earlier id files remain valid.
+    '''
+    filenames = ['uris_' + lang + '.txt' for lang in langs]
+    uridict.build(filenames, dict_file, append=True)
+
+    uri_dict = uridict.open_dict(dict_file)
+    print('Dictionary size: {}'.format(len(uri_dict)))
+
+    for lang, filename in zip(langs, filenames):
+        uridict.encode_list(filename, 'uris_' + lang + '.ids', uri_dict)
 
 
 if __name__ == "__main__":
     get_uris('nl')
     get_uris('en')
+    encode_uris(['nl', 'en'])
@@ -23,19 +23,50 @@
 import argparse
 import json
 import logging
+import queue
 import sys
+import threading
 import time
 
-# Third-party library imports
-import requests
-
 # DBpedia Indexer imports
+import checkpoint
+import client
+import dumps
+import embeddings
+import fingerprints
+import inlinks
+import jsru
+import memo
 import record
+import shards
+import topics
 import update
+import uridict
+import vectorcodec
+import wdaliases
 
 
 SOLR_UPDATE_URL = 'http://linksolr1.kbresearch.nl/dbpedia/update'
 SOLR_JSON_URL = SOLR_UPDATE_URL + '/json/docs'
+SOLR_ATOMIC_URL = SOLR_UPDATE_URL + '?failOnVersionConflicts=false'
+
+BATCH_SIZE = 1
+BATCH_BYTES = 10 * 1024 * 1024
+COMMIT_EVERY = 100
+SEND_RETRIES = 3
+
+FETCH_WORKERS = 8
+LOAD_WORKERS = 2
+QUEUE_SIZE = 1000
+
+# URI dictionary for reading id files, set from the command line
+URI_DICT = None
+
+# Send atomic updates of the changed fields only for update actions
+ATOMIC = False
+
+# Fingerprint store for incremental indexing, set from the command line
+FINGERPRINTS = None
 
 logging.basicConfig(level=logging.INFO)
 logging.getLogger('requests').setLevel(logging.WARNING)
@@ -52,105 +83,547 @@ logger.addHandler(handler)
 
 def commit():
     '''
-    Commit changes to Solr index.
+    Commit changes to Solr index. In incremental mode, the fingerprints of
+    the documents accepted before the commit are saved afterwards.
     '''
     logger.info('Committing changes...')
-    resp = requests.get(SOLR_UPDATE_URL + '?commit=true')
+    acked = FINGERPRINTS.take() if FINGERPRINTS else None
+    resp = client.get(SOLR_UPDATE_URL + '?commit=true')
+    if FINGERPRINTS:
+        FINGERPRINTS.save(acked)
 
 
-def index_list(in_file, action='full', start=0, stop=0):
+def get_payload(uri, action='full', predictions=None):
     '''
-    Retrieve document for each URI on the list and send it to Solr.
+    Retrieve the document for the specified URI and serialize it. Return
+    False if there is nothing to index for the URI and None if retrieval
+    failed. Predicted topics and types for the topics action are retrieved
+    unless they are given. Update actions may be combined as a comma
+    separated list, applied in sequence to a single retrieved document. In
+    atomic mode, update actions produce an atomic update of the changed
+    fields instead of the whole document. In incremental mode, full
+    documents that are unchanged since the last run are skipped.
     '''
-    with open(in_file, 'rb') as fh:
-        for i, uri in enumerate(fh):
+    retries = 0
 
-            # Start from a specific line number
-            if i < start or (stop and i > stop):
-                continue
+    while retries < 5:
+        try:
+            if action == 'full':
+                doc = record.get_document(uri)
+                if FINGERPRINTS and not FINGERPRINTS.check(uri, doc):
+                    return False
+            elif ATOMIC:
+                doc = update.get_atomic_update(uri, action.split(','),
+                                               predictions)
+                if not doc:
+                    return False
             else:
-                # Report every 10 requests
-                if i % 10 == 0:
-                    logger.info('Processing file {}, record {}'.format(in_file,
-                                                                       i))
+                doc = update.get_document(uri, action.split(','),
+                                          predictions)
+                if not doc:
+                    return False
+            payload = json.dumps(doc, ensure_ascii=False)
+            return payload.encode('utf-8')
+
+        except Exception as e:
+            time.sleep(1)
+            retries += 1
+
+    return None
+
+
+def send_batch(batch):
+    '''
+    Send a batch of (uri, payload) pairs to Solr as a single JSON array and
+    return the URIs of the documents that were rejected. A batch rejected
+    by Solr is split in half and resent until the offending documents are
+    found. A batch that cannot be sent at all is retried as a whole and
+    fails as a whole. Atomic updates are sent to the plain update handler,
+    as the JSON document handler does not support them. They only apply
+    to documents in the index, and are skipped for other documents.
+    '''
+    if not batch:
+        return []
+
+    payload = b'[' + b','.join([p for u, p in batch]) + b']'
+    headers = {'Content-Type': 'application/json'}
+    url = SOLR_ATOMIC_URL if ATOMIC else SOLR_JSON_URL
+
+    retries = 0
+    while True:
+        try:
+            resp = client.post(url, data=payload, headers=headers,
+                               timeout=60).json()
+            status = resp['responseHeader']['status']
+            break
+        except Exception as e:
+            retries += 1
+            if retries >= SEND_RETRIES:
+                return [u for u, p in batch]
+            time.sleep(1)
+
+    if status == 0:
+        return []
+    if len(batch) == 1:
+        # Solr versions that do not support failOnVersionConflicts reject
+        # atomic updates of documents that are not in the index
+        if ATOMIC and status == 409:
+            return []
+        return [batch[0][0]]
+    middle = len(batch) // 2
+    return send_batch(batch[:middle]) + send_batch(batch[middle:])
+
+
+def get_payloads(uris, action='full'):
+    '''
+    Retrieve and serialize the documents for a list of URIs and return
+    (uri, payload) pairs, with payloads as returned by get_payload. Full
+    documents are fetched for all URIs at once, falling back to single
+    retrieval for URIs that could not be processed in the batch.
+    '''
+    docs = {}
+    predictions = {}
+
+    if action == 'full' and len(uris) > 1:
+        try:
+            docs = record.get_documents(uris)
+        except Exception as e:
+            docs = {}
+
+    if ('topics' in action.split(',') and topics.BATCH and
+            len(uris) > 1):
+        try:
+            predictions = topics.get_topics_batch(uris)
+        except Exception as e:
+            predictions = {}
+
+    payloads = []
+    for uri in uris:
+        if uri in docs and FINGERPRINTS and not FINGERPRINTS.check(
+                uri, docs[uri]):
+            payloads.append((uri, False))
+        elif uri in docs:
+            payload = json.dumps(docs[uri], ensure_ascii=False)
+            payloads.append((uri, payload.encode('utf-8')))
+        else:
+            payloads.append((uri, get_payload(uri, action,
+                                              predictions.get(uri))))
+
+    return payloads
+
+
+def flush(batch):
+    '''
+    Send the current batch to Solr, log the rejected URIs and empty the
+    batch.
+    '''
+    failed = send_batch(batch)
+    for uri in failed:
+        msg = 'SOLR error for URI: {}'.format(uri)
+        logger.error(msg)
+    if FINGERPRINTS:
+        FINGERPRINTS.ack([u for u, p in batch if u not in failed], failed)
+    del batch[:]
+
+
+def load(payloads, batch, batch_size=BATCH_SIZE, batch_bytes=BATCH_BYTES):
+    '''
+    Add (uri, payload) pairs to the batch, sending the batch to Solr
+    whenever it holds batch_size documents or batch_bytes bytes. Return the
+    number of documents sent.
+    '''
+    sent = 0
+
+    for uri, payload in payloads:
+        if payload is False:
+            # logger.info('Skipping URI: {}'.format(uri))
+            continue
+
+        if not payload:
+            msg = 'VOS error for URI: {}'.format(uri)
+            logger.error(msg)
+            continue
+
+        # logger.info('Indexing URI: {}'.format(uri))
+        batch_len = sum([len(p) for u, p in batch])
+        if batch and batch_len + len(payload) > batch_bytes:
+            sent += len(batch)
+            flush(batch)
+
+        batch.append((uri, payload))
 
-                # Commit every 100 requests
-                if i % 100 == 0:
+        if len(batch) >= batch_size:
+            sent += len(batch)
+            flush(batch)
+
+    return sent
+
+
+def read_input(in_file, offset=0, line=0, end=None, shard=None):
+    '''
+    Yield (offset, line, uri) tuples for the URIs on the input list, which
+    is either a plain text file or, with the .ids extension, an array of
+    ids in URI_DICT. The offset is the byte offset just past the URI.
+    Reading starts at the specified offset and line number and stops at
+    the end offset, if any. URIs outside the hash partitioned shard, if
+    any, are left out.
+    '''
+    if in_file.endswith('.ids'):
+        ids = uridict.read_ids(in_file, URI_DICT)
+        stop = len(ids) if end is None else end // ids.itemsize
+        for i in range(offset // ids.itemsize, stop):
+            uri = URI_DICT.uri(ids[i])
+            if not shard or shards.in_shard(uri, shard):
+                yield (i + 1) * ids.itemsize, line, uri
+            line += 1
+    else:
+        with open(in_file, 'rb') as fh:
+            fh.seek(offset)
+            for uri in iter(fh.readline, b''):
+                if end is not None and offset >= end:
+                    break
+                offset += len(uri)
+                uri = uri.decode('utf-8').split()[-1]
+                if not shard or shards.in_shard(uri, shard):
+                    yield offset, line, uri
+                line += 1
+
+
+def open_journal(in_file, journal_file=None, resume=False, offset=0,
+                 line=0):
+    '''
+    Open the progress journal for the input file. Return the journal and
+    the offset and line number to start reading from, which are those
+    given unless resuming.
+    '''
+    journal = checkpoint.Checkpoint(journal_file or in_file + '.journal')
+
+    if resume and journal.uri:
+        logger.info('Resuming file {} after record {}: {}'.format(
+            in_file, journal.line, journal.uri))
+        return journal, journal.offset, journal.line + 1
+
+    return journal, offset, line
+
+
+def open_shard(in_file, journal_file=None, resume=False, shard=None,
+               shard_mode='contiguous'):
+    '''
+    Determine the part of the input file to be read for a shard, if any.
+    Return the journal, the offset and line number to start reading from,
+    the offset to stop at and the shard for hash partitioning.
+    '''
+    if not shard:
+        journal, offset, line = open_journal(in_file, journal_file, resume)
+        return journal, offset, line, None, None
+
+    journal_file = journal_file or '{}.{}.journal'.format(
+        in_file, shards.shard_name(shard))
+
+    if shard_mode == 'hash':
+        journal, offset, line = open_journal(in_file, journal_file, resume)
+        return journal, offset, line, None, shard
+
+    if in_file.endswith('.ids'):
+        offset, end, line = shards.get_range(in_file, shard, 4,
+                                             uridict.count_ids(in_file))
+    else:
+        offset, end, line = shards.get_range(in_file, shard)
+    journal, offset, line = open_journal(in_file, journal_file, resume,
+                                         offset, line)
+    return journal, offset, line, end, None
+
+
+def index_list(in_file, action='full', start=0, stop=0,
+               batch_size=BATCH_SIZE, batch_bytes=BATCH_BYTES,
+               journal_file=None, resume=False, shard=None,
+               shard_mode='contiguous'):
+    '''
+    Retrieve document for each URI on the list and send it to Solr, in
+    batches of at most batch_size documents or batch_bytes bytes. Changes
+    are committed after the first batch that brings the number of URIs
+    processed since the last commit to COMMIT_EVERY. The position of the
+    last committed URI is kept in a journal, from which the run can be
+    resumed. If a (shard, shards) tuple is given, only the URIs in that
+    shard are indexed.
+    '''
+    batch = []
+    uris = []
+    last = None
+    processed = 0
+
+    journal, offset, line, end, shard = open_shard(in_file, journal_file,
+                                                   resume, shard, shard_mode)
+
+    for offset, i, uri in read_input(in_file, offset, line, end, shard):
+
+        # Start from a specific line number
+        if i < start or (stop and i > stop):
+            continue
+        else:
+            # Report every 10 requests
+            if i % 10 == 0:
+                logger.info('Processing file {}, record {}'.format(in_file,
+                                                                   i))
+
+            uris.append(uri)
+            last = (offset, i, uri)
+
+            # Get data to be indexed and send it to Solr
+            if len(uris) >= batch_size:
+                load(get_payloads(uris, action), batch, batch_size,
+                     batch_bytes)
+                processed += len(uris)
+                uris = []
+
+                # Commit every COMMIT_EVERY requests, at a batch boundary
+                if processed >= COMMIT_EVERY:
+                    flush(batch)
                     commit()
+                    journal.save(last)
+                    processed = 0
+
+    # Send remaining documents and commit at end of file
+    load(get_payloads(uris, action), batch, batch_size, batch_bytes)
+    flush(batch)
+    commit()
+    journal.save(last)
+
+
+def index_solr(action, query='*:*', cursor='*', batch_size=BATCH_SIZE,
+               batch_bytes=BATCH_BYTES):
+    '''
+    Apply an update action to the stored documents matching the query,
+    streamed from Solr in a single sequential scan instead of being
+    retrieved one by one. The cursor from which to resume is logged at
+    every commit.
+    '''
+    actions = action.split(',')
+    fields = update.get_stream_fields(actions, ATOMIC)
+    docs = update.iter_current(query, fields, cursor=cursor)
+    batch = []
+    payloads = []
+    processed = 0
+
+    for i, (cursor, doc) in enumerate(docs):
 
-                # Get URI
-                uri = uri.decode('utf-8')
-                uri = uri.split()[-1]
-
-                # Get data to be indexed
-                retries = 0
-                payload = None
-                skip = False
-
-                while not payload and retries < 5:
-                    try:
-                        if action == 'full':
-                            doc = record.get_document(uri)
-                        elif action == 'ocr':
-                            doc = update.get_document_ocr(uri)
-                        elif action == 'topics':
-                            doc = update.get_document_topics(uri)
-                        elif action == 'last_part':
-                            doc = update.get_document_last_part(uri)
-                            if not doc:
-                                skip = True
-                                break
-                        elif action == 'remove_last_part':
-                            doc = update.get_document_remove_last_part(uri)
-                            if not doc:
-                                skip = True
-                                break
-                        elif action == 'abstract':
-                            doc = update.get_document_abstract(uri)
-                        elif action == 'abstract_norm':
-                            doc = update.get_document_abstract_norm(uri)
-                        elif action == 'vectors':
-                            doc = update.get_document_vectors(uri)
-                        elif action == 'vectors_bin':
-                            doc = update.get_document_vectors_bin(uri)
-                        elif action == 'remove_vectors_bin':
-                            doc = update.get_document_remove_vectors_bin(uri)
-                        elif action == 'consonants':
-                            doc = update.get_document_normalize_consonants(uri)
-                        payload = json.dumps(doc, ensure_ascii=False)
-                        payload = payload.encode('utf-8')
-
-                    except Exception as e:
-                        time.sleep(1)
-                        retries += 1
-                        continue
-
-                if skip:
-                    # logger.info('Skipping URI: {}'.format(uri))
-                    continue
-
-                if not payload:
-                    msg = 'VOS error for URI: {}'.format(uri)
-                    logger.error(msg)
-                    continue
-
-                # Send the data to Solr
-                # logger.info('Indexing URI: {}'.format(uri))
-
-                try:
-                    headers = {'Content-Type': 'application/json'}
-                    resp = requests.post(SOLR_JSON_URL, data=payload,
-                                         headers=headers, timeout=60).json()
-                    status = resp['responseHeader']['status']
-                    if status != 0:
-                        raise Exception()
-
-                except Exception as e:
-                    msg = 'SOLR error for URI: {}'.format(uri)
-                    logger.error(msg)
+        # Report every 10 requests
+        if i % 10 == 0:
+            logger.info('Processing query {}, record {}'.format(query, i))
+
+        processed += 1
+
+        try:
+            if ATOMIC:
+                doc = update.atomic_update(doc, actions)
+            else:
+                doc = update.apply_actions(doc, actions)
+        except Exception as e:
+            msg = 'Update error for URI: {}'.format(doc['id'])
+            logger.error(msg)
+            continue
+
+        if doc:
+            payload = json.dumps(doc, ensure_ascii=False)
+            payloads.append((doc['id'], payload.encode('utf-8')))
+
+        if len(payloads) >= batch_size:
+            load(payloads, batch, batch_size, batch_bytes)
+            payloads = []
+
+            # Commit every COMMIT_EVERY requests, at a batch boundary
+            if processed >= COMMIT_EVERY:
+                flush(batch)
+                commit()
+                logger.info('Committed, resume from cursor {}'.format(
+                    cursor))
+                processed = 0
+
+    # Send remaining documents and commit at end of stream
+    load(payloads, batch, batch_size, batch_bytes)
+    flush(batch)
+    commit()
+
+
+def put(out_queue, item, stopped):
+    '''
+    Put an item on a pipeline queue, giving up if the pipeline is stopped
+    while the queue is full. Return whether the item was put.
+    '''
+    while not stopped.is_set():
+        try:
+            out_queue.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def get(in_queue, stopped):
+    '''
+    Get an item from a pipeline queue, returning None if the pipeline is
+    stopped while the queue is empty.
+    '''
+    while not stopped.is_set():
+        try:
+            return in_queue.get(timeout=1)
+        except queue.Empty:
+            continue
+    return None
+
+
+def run_stage(target, args, stopped, errors):
+    '''
+    Run a pipeline stage in a worker thread. An exception raised by the
+    stage is recorded for the main thread and stops the pipeline.
+    '''
+    try:
+        target(*args)
+    except Exception as e:
+        logger.exception('Pipeline stage {} failed'.format(target.__name__))
+        errors.append(e)
+        stopped.set()
+
+
+def read_stage(in_file, start, stop, batch_size, out_queue, journal,
+               stopped, offset=0, line=0, end=None, shard=None):
+    '''
+    Pipeline stage reading the URIs from the input file in lists of
+    batch_size URIs, each with the position of its last URI.
+    '''
+    uris = []
+
+    for offset, i, uri in read_input(in_file, offset, line, end, shard):
+
+        # Start from a specific line number
+        if i < start or (stop and i > stop):
+            continue
+
+        # Report every 10 requests
+        if i % 10 == 0:
+            logger.info('Processing file {}, record {}'.format(in_file,
+                                                               i))
+
+        uris.append(uri)
+        last = (offset, i, uri)
+
+        if len(uris) >= batch_size:
+            journal.add(last)
+            if not put(out_queue, (last, uris), stopped):
+                return
+            uris = []
+
+    if uris:
+        journal.add(last)
+        put(out_queue, (last, uris), stopped)
+
+
+def fetch_stage(action, in_queue, out_queue, stopped):
+    '''
+    Pipeline stage retrieving and serializing the documents for each list
+    of URIs.
+    '''
+    while True:
+        item = get(in_queue, stopped)
+        if item is None:
+            break
+
+        position, uris = item
+        if not put(out_queue, (position, get_payloads(uris, action)),
+                   stopped):
+            break
+
+
+def load_stage(in_queue, batch_size, batch_bytes, progress, journal,
+               stopped):
+    '''
+    Pipeline stage sending batches of documents to Solr. Changes are
+    committed whenever the total number of URIs processed by all loaders,
+    whether or not a document was sent for them, passes a multiple of
+    COMMIT_EVERY, after which the journal is updated.
+    '''
+    batch = []
+
+    while True:
+        item = get(in_queue, stopped)
+        if item is None:
+            break
+
+        position, payloads = item
+        load(payloads, batch, batch_size, batch_bytes)
+        flush(batch)
+        journal.ack(position)
+
+        with progress['lock']:
+            before = progress['processed']
+            progress['processed'] += len(payloads)
+            after = progress['processed']
+        if before // COMMIT_EVERY != after // COMMIT_EVERY:
+            position = journal.position()
+            commit()
+            journal.save(position)
+
+
+def index_pipeline(in_file, action='full', start=0, stop=0,
+                   batch_size=BATCH_SIZE, batch_bytes=BATCH_BYTES,
+                   fetch_workers=FETCH_WORKERS, load_workers=LOAD_WORKERS,
+                   queue_size=QUEUE_SIZE, journal_file=None, resume=False,
+                   shard=None, shard_mode='contiguous'):
+    '''
+    Index the URIs on the list with separate threads for reading,
+    fetching and loading, joined by bounded queues so that memory use is
+    limited to queue_size batches of URIs and of documents in flight. If
+    any stage fails, the whole pipeline is stopped and the exception is
+    raised again, leaving the journal at the last commit for resuming.
+    '''
+    uri_queue = queue.Queue(maxsize=queue_size)
+    doc_queue = queue.Queue(maxsize=queue_size)
+    progress = {'lock': threading.Lock(), 'processed': 0}
+    stopped = threading.Event()
+    errors = []
+
+    journal, offset, line, end, shard = open_shard(in_file, journal_file,
+                                                   resume, shard, shard_mode)
+
+    fetchers = [threading.Thread(target=run_stage,
+                                 args=(fetch_stage, (action, uri_queue,
+                                       doc_queue, stopped), stopped, errors))
+                for i in range(fetch_workers)]
+    loaders = [threading.Thread(target=run_stage,
+                                args=(load_stage, (doc_queue, batch_size,
+                                      batch_bytes, progress, journal,
+                                      stopped), stopped, errors))
+               for i in range(load_workers)]
+
+    for t in fetchers + loaders:
+        t.daemon = True
+        t.start()
+
+    try:
+        read_stage(in_file, start, stop, batch_size, uri_queue, journal,
+                   stopped, offset, line, end, shard)
+
+        # Shut down each stage once the previous one has finished
+        for t in fetchers:
+            put(uri_queue, None, stopped)
+        for t in fetchers:
+            t.join()
+
+        for t in loaders:
+            put(doc_queue, None, stopped)
+        for t in loaders:
+            t.join()
+    except BaseException:
+        stopped.set()
+        raise
+
+    if errors:
+        raise errors[0]
 
     # Commit at end of file
+    position = journal.position()
     commit()
+    journal.save(position)
 
 
 if __name__ == '__main__':
@@ -159,13 +632,202 @@ if __name__ == '__main__':
     parser.add_argument('--input', required=False, type=str,
                         default='uris_nl.txt', help='path to input file')
     parser.add_argument('--action', required=False, type=str,
-                        default='full', help='type of indexer action')
+                        default='full', help='type of indexer action, or a '
+                        'comma separated list of update actions to apply '
+                        'in a single pass')
+    parser.add_argument('--atomic', required=False, action='store_true',
+                        help='send atomic updates of the changed fields '
+                        'only, for actions other than full')
+    parser.add_argument('--source', required=False, type=str,
+                        default='file', choices=['file', 'solr'],
+                        help='read the URIs from the input file, or stream '
+                        'the stored documents from Solr for update actions')
+    parser.add_argument('--query', required=False, type=str,
+                        default='*:*',
+                        help='query selecting the documents to stream from '
+                        'Solr')
+    parser.add_argument('--cursor', required=False, type=str,
+                        default='*',
+                        help='cursor to resume streaming from Solr from')
+    parser.add_argument('--incremental', required=False, type=str,
+                        default=None,
+                        help='path to fingerprint store, to send only new '
+                        'and changed documents for the full action, with '
+                        'the shard name appended when sharding')
+    parser.add_argument('--summary', required=False, type=str,
+                        default=None, help='path to summary of changes, '
+                        'defaults to fingerprint store with .summary '
+                        'extension')
     parser.add_argument('--start', required=False, type=int,
                         default=0, help='start position in input file')
     parser.add_argument('--stop', required=False, type=int,
                         default=0, help='stop position in input file')
+    parser.add_argument('--journal', required=False, type=str,
+                        default=None, help='path to progress journal, '
+                        'defaults to input file with .journal extension')
+    parser.add_argument('--resume', required=False, action='store_true',
+                        help='resume from the position in the journal')
+    parser.add_argument('--shard', required=False, type=shards.parse_shard,
+                        default=None, help='index only shard i of N of the '
+                        'input, given as i/N with i counted from 0')
+    parser.add_argument('--shard-mode', required=False, type=str,
+                        default='contiguous', choices=shards.MODES,
+                        help='split the input in contiguous ranges of lines '
+                        'or by hash of the URI')
+    parser.add_argument('--batch-size', required=False, type=int,
+                        default=BATCH_SIZE,
+                        help='max number of documents per Solr request and '
+                        'number of URIs per Virtuoso request')
+    parser.add_argument('--batch-bytes', required=False, type=int,
+                        default=BATCH_BYTES,
+                        help='max payload size in bytes per Solr request')
+    parser.add_argument('--commit-every', required=False, type=int,
+                        default=COMMIT_EVERY,
+                        help='number of uris after which to commit, at the '
+                        'end of a batch')
+    parser.add_argument('--pipeline', required=False, action='store_true',
+                        help='run reading, fetching and loading concurrently')
+    parser.add_argument('--fetch-workers', required=False, type=int,
+                        default=FETCH_WORKERS,
+                        help='number of fetch threads in pipeline mode')
+    parser.add_argument('--load-workers', required=False, type=int,
+                        default=LOAD_WORKERS,
+                        help='number of Solr loader threads in pipeline mode')
+    parser.add_argument('--queue-size', required=False, type=int,
+                        default=QUEUE_SIZE,
+                        help='max number of batches between pipeline stages')
+    parser.add_argument('--records', required=False, type=str,
+                        default=None,
+                        help='path to record store built by dumps.py')
+    parser.add_argument('--inlinks', required=False, type=str,
+                        default=None,
+                        help='path to inlink table built by inlinks.py')
+    parser.add_argument('--wd-aliases', required=False, type=str,
+                        default=None,
+                        help='path to Wikidata alias store built by '
+                        'wdaliases.py, whose cache gets the shard name '
+                        'appended when sharding')
+    parser.add_argument('--jsru-cache', required=False, type=str,
+                        default=None,
+                        help='path to newspaper count cache, with the '
+                        'shard name appended when sharding')
+    parser.add_argument('--jsru-ttl', required=False, type=int,
+                        default=jsru.TTL,
+                        help='max age of cached newspaper counts in seconds')
+    parser.add_argument('--embeddings', required=False, type=str,
+                        default=None,
+                        help='prefix of embedding store built by '
+                        'embeddings.py')
+    parser.add_argument('--topics-batch', required=False,
+                        action='store_true',
+                        help='request topics for a whole batch at once')
+    parser.add_argument('--topics-url', required=False, type=str,
+                        default=topics.TOPICS_URL,
+                        help='topics service url')
+    parser.add_argument('--vector-codec', required=False, type=str,
+                        default=vectorcodec.CODEC,
+                        choices=sorted(vectorcodec.CODECS),
+                        help='encoding of binary vectors')
+    parser.add_argument('--dict', required=False, type=str,
+                        default='uris.dict',
+                        help='path to URI dictionary for .ids input files')
+    parser.add_argument('--pool-size', required=False, type=int,
+                        default=client.POOL_SIZE,
+                        help='max number of connections per host')
+    parser.add_argument('--timeout', required=False, type=int,
+                        default=client.TIMEOUT,
+                        help='default timeout in seconds for HTTP requests')
 
     args = parser.parse_args()
 
-    index_list(vars(args)['input'], vars(args)['action'],
-               vars(args)['start'], vars(args)['stop'])
+    actions = vars(args)['action'].split(',')
+    if 'full' in actions and len(actions) > 1:
+        parser.error('the full action cannot be combined with others')
+    for action in actions:
+        if action != 'full' and action not in update.ACTIONS:
+            parser.error('unknown action: {}'.format(action))
+
+    if vars(args)['incremental'] and vars(args)['action'] != 'full':
+        parser.error('incremental indexing requires the full action')
+
+    if vars(args)['source'] == 'solr' and vars(args)['action'] == 'full':
+        parser.error('streaming from Solr requires an update action')
+
+    # Keep a separate error log for each shard
+    if vars(args)['shard']:
+        logger.removeHandler(handler)
+        handler = logging.FileHandler('index.{}.log'.format(
+            shards.shard_name(vars(args)['shard'])), mode='a')
+        handler.setFormatter(formatter)
+        handler.setLevel(logging.ERROR)
+        logger.addHandler(handler)
+
+    client.configure(vars(args)['pool_size'], vars(args)['timeout'])
+
+    ATOMIC = vars(args)['atomic']
+    COMMIT_EVERY = vars(args)['commit_every']
+
+    if vars(args)['wd_aliases']:
+        # The dump store is only read, but each shard writes its own
+        # cache of aliases retrieved from the web service
+        record.WD_ALIASES = wdaliases.open_store(
+            vars(args)['wd_aliases'], shards.shard_path(
+                vars(args)['wd_aliases'] + '.cache', vars(args)['shard']))
+
+    if vars(args)['jsru_cache']:
+        record.JSRU_CACHE = jsru.open_cache(shards.shard_path(
+            vars(args)['jsru_cache'], vars(args)['shard']),
+            vars(args)['jsru_ttl'])
+
+    if vars(args)['embeddings']:
+        embeddings.STORE = embeddings.open_store(vars(args)['embeddings'])
+
+    vectorcodec.CODEC = vars(args)['vector_codec']
+
+    topics.BATCH = vars(args)['topics_batch']
+    topics.TOPICS_URL = vars(args)['topics_url']
+
+    if vars(args)['input'].endswith('.ids'):
+        URI_DICT = uridict.open_dict(vars(args)['dict'])
+
+    # Each shard keeps its own fingerprints, as a store can only be
+    # written by one process
+    fingerprint_path = None
+    if vars(args)['incremental']:
+        fingerprint_path = shards.shard_path(vars(args)['incremental'],
+                                             vars(args)['shard'])
+        FINGERPRINTS = fingerprints.open_store(fingerprint_path)
+
+    if vars(args)['records']:
+        record.RECORD_STORE = dumps.open_store(vars(args)['records'])
+
+    if vars(args)['inlinks']:
+        record.INLINK_TABLE = inlinks.open_table(vars(args)['inlinks'])
+
+    if vars(args)['source'] == 'solr':
+        index_solr(vars(args)['action'], vars(args)['query'],
+                   vars(args)['cursor'], vars(args)['batch_size'],
+                   vars(args)['batch_bytes'])
+    elif vars(args)['pipeline']:
+        index_pipeline(vars(args)['input'], vars(args)['action'],
+                       vars(args)['start'], vars(args)['stop'],
+                       vars(args)['batch_size'], vars(args)['batch_bytes'],
+                       vars(args)['fetch_workers'], vars(args)['load_workers'],
+                       vars(args)['queue_size'], vars(args)['journal'],
+                       vars(args)['resume'], vars(args)['shard'],
+                       vars(args)['shard_mode'])
+    else:
+        index_list(vars(args)['input'], vars(args)['action'],
+                   vars(args)['start'], vars(args)['stop'],
+                   vars(args)['batch_size'], vars(args)['batch_bytes'],
+                   vars(args)['journal'], vars(args)['resume'],
+                   vars(args)['shard'], vars(args)['shard_mode'])
+
+    if FINGERPRINTS:
+        counts = FINGERPRINTS.write_summary(vars(args)['summary'] or
+                                            fingerprint_path + '.summary')
+        logger.info('New: {new}, changed: {changed}, unchanged: '
+                    '{unchanged}, failed: {failed}'.format(**counts))
+        FINGERPRINTS.close()
+
+    memo.log_stats(logger)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import argparse
+import array
+import bisect
+import hashlib
+import heapq
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+
+# DBpedia Indexer imports
+import dumps
+import record
+
+MAGIC = b'INLINKS1'
+HEADER = struct.Struct('<8sQ')
+PAIR = struct.Struct('<QI')
+
+PAGE_LINKS = ['page_links_en.ttl', 'page_links_nl.ttl']
+
+
+def uri_hash(uri):
+    '''
+    Return a 64-bit hash of a uri.
+    '''
+    digest = hashlib.blake2b(uri.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def count_chunk(args):
+    '''
+    Count the inlinks per uri hash in a chunk of a page links dump and
+    write the sorted (hash, count) pairs to a run file.
+    '''
+    path, start, end, tmp_dir = args
+
+    counts = {}
+    for line in dumps.read_chunk(path, start, end):
+        triple = dumps.parse_triple(line.decode('utf-8'))
+        if triple and triple[1] == record.PROP_LINK:
+            h = uri_hash(triple[2])
+            counts[h] = counts.get(h, 0) + 1
+
+    fd, run = tempfile.mkstemp(suffix='.run', dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as fh:
+        for h in sorted(counts):
+            fh.write(PAIR.pack(h, counts[h]))
+    return run
+
+
+def read_run(run):
+    '''
+    Yield the (hash, count) pairs from a run file.
+    '''
+    with open(run, 'rb') as fh:
+        while True:
+            data = fh.read(PAIR.size * 4096)
+            if not data:
+                break
+            for pair in PAIR.iter_unpack(data):
+                yield pair
+
+
+def build(paths, out_file, workers=dumps.WORKERS,
+          chunk_size=dumps.CHUNK_SIZE, tmp_dir=None):
+    '''
+    Count the inlinks of every uri in the page links dumps and write them
+    to a table of sorted uri hashes followed by their counts.
+    '''
+    chunks = [c + (tmp_dir,) for c in dumps.get_chunks(paths, chunk_size)]
+    with multiprocessing.Pool(workers) as pool:
+        runs = pool.map(count_chunk, chunks)
+
+    hashes = array.array('Q')
+    counts = array.array('I')
+
+    last = None
+    for h, count in heapq.merge(*[read_run(r) for r in runs]):
+        if h == last:
+            counts[-1] += count
+        else:
+            hashes.append(h)
+            counts.append(count)
+            last = h
+
+    for run in runs:
+        os.remove(run)
+
+    with open(out_file, 'wb') as fh:
+        fh.write(HEADER.pack(MAGIC, len(hashes)))
+        hashes.tofile(fh)
+        counts.tofile(fh)
+
+    print('Stored inlink counts for {} uris'.format(len(hashes)))
+
+
+class InlinkTable(object):
+    '''
+    Read-only, memory-mapped inlink count table. The mapping is shared
+    through the page cache by all processes using the same table.
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            self.mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, n = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise Exception('Not an inlink table: {}'.format(path))
+
+        view = memoryview(self.mm)
+        start = HEADER.size
+        self.hashes = view[start:start + 8 * n].cast('Q')
+        self.counts = view[start + 8 * n:start + 12 * n].cast('I')
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def get(self, uri):
+        '''
+        Return the number of inlinks of a uri.
+        '''
+        h = uri_hash(uri)
+        i = bisect.bisect_left(self.hashes, h)
+        if i < len(self.hashes) and self.hashes[i] == h:
+            return self.counts[i]
+        return 0
+
+
+def open_table(path):
+    '''
+    Open an inlink table for lookups.
+    '''
+    return InlinkTable(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--dir', required=False, type=str,
+                        default='.', help='directory containing the dumps')
+    parser.add_argument('--output', required=False, type=str,
+                        default='inlinks.bin', help='path to inlink table')
+    parser.add_argument('--workers', required=False, type=int,
+                        default=dumps.WORKERS, help='number of processes')
+    parser.add_argument('--tmp', required=False, type=str,
+                        default=None, help='directory for sorted runs')
+    parser.add_argument('--show', required=False, type=str,
+                        default=None, help='print the inlink count for uri')
+
+    args = parser.parse_args()
+
+    if vars(args)['show']:
+        table = open_table(vars(args)['output'])
+        print(table.get(vars(args)['show']))
+        sys.exit()
+
+    build([os.path.join(vars(args)['dir'], n) for n in PAGE_LINKS],
+          vars(args)['output'], vars(args)['workers'],
+          tmp_dir=vars(args)['tmp'])
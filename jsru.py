@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import argparse
+import concurrent.futures
+import dbm
+import json
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+# DBpedia Indexer imports
+import client
+
+JSRU_URL = 'http://jsru.kb.nl/sru/'
+JSRU_URL += 'sru?x-collection=DDD_artikel&recordSchema=dcx&query='
+JSRU_URL += 'cql.serverChoice exact "%s"&maximumRecords=0'
+
+TTL = 30 * 24 * 60 * 60
+WORKERS = 8
+
+
+def fetch_count(label):
+    '''
+    Count the number of times the label appears in the newspaper corpus.
+    '''
+    jsru = client.get(JSRU_URL % label)
+    jsru_data = ET.fromstring(jsru.text)
+
+    for item in jsru_data.iter():
+        if item.tag.endswith('numberOfRecords'):
+            return(item.text)
+
+    return None
+
+
+class CountCache(object):
+    '''
+    Persistent label to newspaper count cache. Counts older than ttl
+    seconds are retrieved again, and concurrent lookups of the same label
+    share a single request.
+    '''
+
+    def __init__(self, path, ttl=TTL):
+        self.db = dbm.open(path, 'c')
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def get(self, label):
+        '''
+        Return the newspaper count for the label.
+        '''
+        key = label.encode('utf-8')
+
+        with self.lock:
+            if key in self.db:
+                count, timestamp = json.loads(self.db[key].decode('utf-8'))
+                if time.time() - timestamp < self.ttl:
+                    return count
+
+            future = self.pending.get(label)
+            if future:
+                leader = False
+            else:
+                future = self.pending[label] = concurrent.futures.Future()
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            count = fetch_count(label)
+            with self.lock:
+                self.db[key] = json.dumps([count, time.time()])
+            future.set_result(count)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                del self.pending[label]
+
+        return future.result()
+
+    def warm(self, labels, workers=WORKERS):
+        '''
+        Retrieve the counts for a list of labels in advance. Return the
+        number of labels for which retrieval failed.
+        '''
+        def get(label):
+            try:
+                self.get(label)
+                return 0
+            except Exception as e:
+                return 1
+
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            return sum(executor.map(get, set(labels)))
+
+
+def open_cache(path, ttl=TTL):
+    '''
+    Open a count cache for lookups.
+    '''
+    return CountCache(path, ttl)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--cache', required=False, type=str,
+                        default='jsru.db', help='path to count cache')
+    parser.add_argument('--ttl', required=False, type=int,
+                        default=TTL, help='max age of counts in seconds')
+    parser.add_argument('--labels', required=False, type=str,
+                        default=None, help='warm up for labels in file')
+    parser.add_argument('--uris', required=False, type=str,
+                        default=None,
+                        help='warm up for labels derived from uri list')
+    parser.add_argument('--workers', required=False, type=int,
+                        default=WORKERS, help='number of warm-up threads')
+
+    args = parser.parse_args()
+
+    if vars(args)['labels']:
+        with open(vars(args)['labels'], 'rb') as fh:
+            labels = [l.strip() for l in fh.read().decode('utf-8').split('\n')]
+    elif vars(args)['uris']:
+        # Pref labels are normalized labels, which mostly equal the titles
+        # in the uris
+        import record
+        with open(vars(args)['uris'], 'rb') as fh:
+            labels = [record.utilities.normalize(record.uri_to_string(
+                      l.split()[-1])) for l in fh.read().decode(
+                      'utf-8').split('\n') if l.strip()]
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+    labels = [l for l in labels if l]
+    cache = open_cache(vars(args)['cache'], vars(args)['ttl'])
+    failed = cache.warm(labels, vars(args)['workers'])
+    print('Warmed up {} labels, {} failed'.format(len(set(labels)), failed))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import functools
+
+CACHE_SIZE = 100000
+
+# Memoized functions by name, for reporting their statistics
+CACHES = {}
+
+
+def cached(maxsize=CACHE_SIZE):
+    '''
+    Decorator memoizing a function of hashable arguments in a bounded LRU
+    cache, which is registered for reporting. The results are shared
+    between callers, so they should not be modified.
+    '''
+    def decorate(func):
+        wrapper = functools.lru_cache(maxsize=maxsize)(func)
+        CACHES['{}.{}'.format(func.__module__, func.__name__)] = wrapper
+        return wrapper
+    return decorate
+
+
+def get_stats():
+    '''
+    Return (name, hits, misses, size) tuples for the memoized functions.
+    '''
+    stats = []
+    for name in sorted(CACHES):
+        info = CACHES[name].cache_info()
+        stats.append((name, info.hits, info.misses, info.currsize))
+    return stats
+
+
+def log_stats(logger):
+    '''
+    Log the hit rate of each memoized function.
+    '''
+    for name, hits, misses, size in get_stats():
+        calls = hits + misses
+        rate = hits / calls if calls else 0.0
+        logger.info('Cache {}: {} calls, {:.1%} hits, {} entries'.format(
+            name, calls, rate, size))
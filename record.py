@@ -23,13 +23,16 @@
 import json
 import os
 import pprint
-import re
 import sys
-import urllib
-import xml.etree.ElementTree as ET
+import urllib.parse
 
-# Third-party library imports
-import requests
+# DBpedia Indexer imports
+import embeddings
+import jsru
+import memo
+import sparql
+import topics
+import wdaliases
 
 # Import DAC modules
 sys.path.insert(0, os.path.join(*[os.path.dirname(
@@ -37,13 +40,13 @@ sys.path.insert(0, os.path.join(*[os.path.dirname(
 import dictionary
 import utilities
 
+# Memoized label normalization, as the same labels recur across documents
+normalize = memo.cached()(utilities.normalize)
+normalize_ocr = memo.cached()(utilities.normalize_ocr)
+
 VIRTUOSO_URL = 'http://openvirtuoso.kbresearch.nl/sparql?'
-WD_URL = 'https://www.wikidata.org/wiki/Special:EntityData/{}.json'
-TOPICS_URL = 'http://kbresearch.nl/topics/?'
-W2V_URL = 'http://kbresearch.nl/word2vec/vectors?'
 
 DEFAULT_GRAPH_URI = 'http://nl.dbpedia.org'
-FORMAT = 'xml'
 
 PROP_ABSTRACT = 'http://dbpedia.org/ontology/abstract'
 PROP_ALIAS = 'http://dbpedia.org/ontology/alias'
@@ -64,6 +67,21 @@ PROP_REDIRECT = 'http://dbpedia.org/ontology/wikiPageRedirects'
 PROP_SAME_AS = 'http://www.w3.org/2002/07/owl#sameAs'
 PROP_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
 
+# Record store built from the dumps by dumps.py, used instead of the
+# triple store when set
+RECORD_STORE = None
+
+# Inlink count table built by inlinks.py, used instead of counting the
+# inlinks in the triple store when set
+INLINK_TABLE = None
+
+# Wikidata alias store built by wdaliases.py, used instead of the Wikidata
+# web service when set
+WD_ALIASES = None
+
+# Newspaper count cache created by jsru.py, used for ddd_jsru when set
+JSRU_CACHE = None
+
 
 def get_prop(uri, prop, subject=True):
     '''
@@ -79,19 +97,10 @@ def get_prop(uri, prop, subject=True):
     ''' % {'subj': subj, 'prop': prop, 'obj': obj}
     query = ' '.join(query.split())
 
-    payload = {
-        'default-graph-uri': DEFAULT_GRAPH_URI,
-        'format': FORMAT,
-        'query': query
-        }
-    response = requests.get(VIRTUOSO_URL, params=payload)
-    s = re.sub('&#([0-9]+);', '', response.text)
-    root = ET.fromstring(s)
-
     values = []
-    for result in root[1]:
-        if result[0][0].text:
-            values.append(result[0][0].text)
+    for binding in sparql.select(VIRTUOSO_URL, query, DEFAULT_GRAPH_URI):
+        if binding.get('x'):
+            values.append(binding['x'])
 
     return values
 
@@ -100,52 +109,126 @@ def get_record(uri):
     '''
     Retrieve all (relevant) triples with specified uri as subject.
     '''
+    return get_records([uri])[uri]
+
+
+def get_records(uris):
+    '''
+    Retrieve all (relevant) triples with any of the specified uris as
+    subject in a single query and split them into a record per uri.
+    '''
+    if RECORD_STORE is not None:
+        return get_stored_records(uris)
+
     query = '''
-    SELECT ?p ?o WHERE {
-        <%(uri)s> ?p ?o .
+    SELECT ?s ?p ?o WHERE {
+        VALUES ?s { %(uris)s }
+        ?s ?p ?o .
         FILTER(isLiteral(?o) || regex(?o, 'http://dbpedia.org') || regex(?o,
         'http://www.wikidata.org/entity') || regex(?o, 'http://nl.dbpedia.org')
         || regex(?o, 'http://schema.org'))
     }
-    ''' % {'uri': uri}
+    ''' % {'uris': ' '.join(['<' + u + '>' for u in uris])}
     query = ' '.join(query.split())
 
-    payload = {
-        'default-graph-uri': DEFAULT_GRAPH_URI,
-        'format': FORMAT,
-        'query': query
-        }
-
-    response = requests.get(VIRTUOSO_URL, params=payload)
-    s = re.sub('&#([0-9]+);', '', response.text)
-    root = ET.fromstring(s)
+    records = {}
+    for uri in uris:
+        records[uri] = {}
 
-    record = {}
-    for result in root[1]:
-        key = result[0][0].text
-        value = result[1][0].text
+    # Long VALUES blocks do not fit in a query string
+    for binding in sparql.select(VIRTUOSO_URL, query, DEFAULT_GRAPH_URI,
+                                 'post'):
+        record = records[binding['s']]
+        key = binding['p']
+        value = binding.get('o')
         if value:
             if key in record:
                 record[key].append(value)
             else:
                 record[key] = [value]
 
-    redirects = get_prop(uri, PROP_REDIRECT, False)
-    if redirects:
-        record[PROP_REDIRECT] = redirects
+    inbound = get_inbound(uris)
 
-    disambiguations = get_prop(uri, PROP_DISAMBIGUATES, False)
-    if disambiguations:
-        record[PROP_DISAMBIGUATES] = disambiguations
+    for uri in uris:
+        record = records[uri]
+        record.update(inbound[uri])
 
-    inlinks = len(get_prop(uri, PROP_LINK, False))
-    record['inlinks'] = [inlinks]
+        record = collapse(record, [PROP_ABSTRACT, PROP_COMMENT])
+        record = collapse(record, [PROP_NAME, PROP_BIRTH_NAME,
+                                   PROP_GIVEN_NAME, PROP_LONG_NAME,
+                                   PROP_ALIAS, PROP_NICK_NAME])
 
-    record = collapse(record, [PROP_ABSTRACT, PROP_COMMENT])
-    record = collapse(record, [PROP_NAME, PROP_BIRTH_NAME, PROP_GIVEN_NAME,
-                               PROP_LONG_NAME, PROP_ALIAS, PROP_NICK_NAME])
+    return records
 
-    return record
+
+def get_stored_records(uris):
+    '''
+    Retrieve the records for the specified uris from the record store.
+    '''
+    records = {}
+    for uri in uris:
+        key = uri.encode('utf-8')
+        if key in RECORD_STORE:
+            records[uri] = json.loads(RECORD_STORE[key].decode('utf-8'))
+        else:
+            records[uri] = {PROP_ABSTRACT: [], PROP_NAME: [], 'inlinks': [0]}
+    return records
+
+
+def get_inbound(uris):
+    '''
+    Retrieve the redirects and disambiguations pointing to each of the
+    specified uris, as well as the number of inlinks counted by the server
+    or looked up in the inlink table, with a single query.
+    '''
+    values = ' '.join(['<' + u + '>' for u in uris])
+
+    # Count the inlinks on the server unless an inlink table is available
+    count = '''
+    UNION
+    {
+        SELECT ?o (COUNT(?y) AS ?n) WHERE {
+            VALUES ?o { %(uris)s }
+            ?y <%(link)s> ?o .
+        }
+        GROUP BY ?o
+    }
+    ''' % {'uris': values, 'link': PROP_LINK}
+    if INLINK_TABLE is not None:
+        count = ''
+
+    query = '''
+    SELECT ?o ?p ?x ?n WHERE {
+        {
+            VALUES ?o { %(uris)s }
+            VALUES ?p { <%(redirect)s> <%(disambiguates)s> }
+            ?x ?p ?o .
+        }
+        %(count)s
+    }
+    ''' % {'uris': values, 'redirect': PROP_REDIRECT,
+           'disambiguates': PROP_DISAMBIGUATES, 'count': count}
+    query = ' '.join(query.split())
+
+    inbound = {}
+    for uri in uris:
+        if INLINK_TABLE is not None:
+            inbound[uri] = {'inlinks': [INLINK_TABLE.get(uri)]}
+        else:
+            inbound[uri] = {'inlinks': [0]}
+
+    for binding in sparql.select(VIRTUOSO_URL, query, DEFAULT_GRAPH_URI,
+                                 'post'):
+        record = inbound[binding['o']]
+        if 'n' in binding:
+            record['inlinks'] = [int(binding['n'])]
+        elif binding.get('x'):
+            if binding['p'] in record:
+                record[binding['p']].append(binding['x'])
+            else:
+                record[binding['p']] = [binding['x']]
+
+    return inbound
 
 
 def collapse(record, fields):
@@ -186,6 +269,7 @@ def remove_spec(s):
     return s
 
 
+@memo.cached()
 def uri_to_string(uri, spec=False):
     '''
     Transform a dbpedia resource uri into a string.
@@ -206,45 +290,44 @@ def uri_to_string(uri, spec=False):
     return s
 
 
+@memo.cached()
+def category_keywords(link):
+    '''
+    Extract the keywords from a category link, as a tuple.
+    '''
+    s = uri_to_string(link).split('Categorie:')[1]
+    # Crude stop word filtering. Use list instead?
+    return tuple([k for k in normalize(s).split() if len(k) >= 5])
+
+
 def get_wd_aliases(wd_uri):
     '''
-    Get additional alternative names form Wikidata web service.
+    Get additional alternative names from the Wikidata alias store if
+    available, or else from the Wikidata web service.
     '''
     wd_id = wd_uri.split('/')[-1]
-    url = WD_URL.format(wd_id)
     try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-    except Exception as e:
-        return []
-    try:
-        alias_dict = data.get('entities').get(wd_id).get('aliases').get('nl')
-        return [a.get('value') for a in alias_dict]
+        if WD_ALIASES is not None:
+            return WD_ALIASES.get(wd_id)
+        return wdaliases.fetch_aliases(wd_id)
     except Exception as e:
         return []
 
 
 def ddd_jsru(preflabel):
     '''
-    Count the number of times the label appears in the newspaper corpus.
+    Count the number of times the label appears in the newspaper corpus,
+    using the count cache if available.
     '''
-    JSRU = 'http://jsru.kb.nl/sru/'
-    JSRU += 'sru?x-collection=DDD_artikel&recordSchema=dcx&query='
-    JSRU += 'cql.serverChoice exact "%s"&maximumRecords=0'
-
-    jsru = requests.get(JSRU % preflabel)
-    jsru_data = ET.fromstring(jsru.text)
+    if JSRU_CACHE is not None:
+        return JSRU_CACHE.get(preflabel)
+    return jsru.fetch_count(preflabel)
 
-    for item in jsru_data.iter():
-        if item.tag.endswith('numberOfRecords'):
-            return(item.text)
 
-    return None
-
-
-def transform(record, uri):
+def transform(record, uri, predictions=None):
     '''
-    Extract the relevant data and return a Solr document dict.
+    Extract the relevant data and return a Solr document dict. Predicted
+    topics and types are retrieved unless they are given.
     '''
     document = {}
 
@@ -270,7 +353,7 @@ def transform(record, uri):
 
     # Normalized pref label, based on the label without specification
     # between brackets
-    pref_label = utilities.normalize(remove_spec(document['label']))
+    pref_label = normalize(remove_spec(document['label']))
     document['pref_label'] = pref_label
     document['pref_label_str'] = pref_label
 
@@ -282,7 +365,8 @@ def transform(record, uri):
 
     bow = utilities.tokenize(document['abstract'], max_sent=5)
     document['abstract_norm'] = ' '.join(bow)
-    document['abstract_token'] = list(set([t for t in bow if len(t) > 5]))[:15]
+    document['abstract_token'] = list(dict.fromkeys(
+        [t for t in bow if len(t) > 5]))[:15]
 
     # Language of the (primary) resource description
     document['lang'] = 'nl' if uri.startswith('http://nl.') else 'en'
@@ -300,7 +384,7 @@ def transform(record, uri):
     # save the specification
     if '_(' in uri and uri.endswith(')'):
         document['ambig'] = 1
-        document['spec'] = utilities.normalize(uri_to_string(uri, True))
+        document['spec'] = normalize(uri_to_string(uri, True))
     else:
         document['ambig'] = 0
 
@@ -345,11 +429,8 @@ def transform(record, uri):
         keywords = []
         for link in record[PROP_LINK]:
             if link.startswith('http://nl.dbpedia.org/resource/Categorie:'):
-                s = uri_to_string(link).split('Categorie:')[1]
-                # Crude stop word filtering. Use list instead?
-                keywords += [k for k in utilities.normalize(s).split() if
-                             len(k) >= 5]
-        keywords = list(set(keywords))
+                keywords += category_keywords(link)
+        keywords = list(dict.fromkeys(keywords))
         for k in pref_label.split():
             if k in keywords:
                 keywords.remove(k)
@@ -357,20 +438,16 @@ def transform(record, uri):
 
     # DBpedia ontology and schema.org types
     if PROP_TYPE in record:
-        document['dbo_type'] = list(set(
+        document['dbo_type'] = list(dict.fromkeys(
             [t.split('/')[-1] for t in record[PROP_TYPE] if
              t.startswith('http://dbpedia.org/ontology/')
              and t.find('Wikidata:') < 0 and t.find('%') < 0]))
-        document['schema_type'] = list(set(
+        document['schema_type'] = list(dict.fromkeys(
             [t.split('/')[-1] for t in record[PROP_TYPE] if
              t.startswith('http://schema.org/')]))
 
     # Predicted topics and types
-    resp = requests.get(TOPICS_URL, params={'url': uri}, timeout=300)
-    if resp.status_code != 200:
-        raise Exception('Error retrieving topics')
-
-    resp = resp.json()
+    resp = predictions or topics.get_topics(uri)
 
     for t in resp['topics']:
         document['topic_{}'.format(t)] = resp['topics'][t]
@@ -416,46 +493,44 @@ def transform(record, uri):
     en_resource = 'http://dbpedia.org/resource/'
 
     if PROP_BIRTH_PLACE in record:
-        places = [utilities.normalize(uri_to_string(p)) for p in
+        places = [normalize(uri_to_string(p)) for p in
                   record[PROP_BIRTH_PLACE] if p.startswith(nl_resource)]
         if not places:
-            places = [utilities.normalize(uri_to_string(p)) for p in
+            places = [normalize(uri_to_string(p)) for p in
                       record[PROP_BIRTH_PLACE] if p.startswith(en_resource)]
-        document['birth_place'] = list(set(places))
+        document['birth_place'] = list(dict.fromkeys(places))
 
     if PROP_DEATH_PLACE in record:
-        places = [utilities.normalize(uri_to_string(p)) for p in
+        places = [normalize(uri_to_string(p)) for p in
                   record[PROP_DEATH_PLACE] if p.startswith(nl_resource)]
         if not places:
-            places = [utilities.normalize(uri_to_string(p)) for p in
+            places = [normalize(uri_to_string(p)) for p in
                       record[PROP_DEATH_PLACE] if p.startswith(en_resource)]
-        document['death_place'] = list(set(places))
+        document['death_place'] = list(dict.fromkeys(places))
 
     # OCR tolerant labels
     if 'pref_label' in document:
-        pref_label_ocr = utilities.normalize_ocr(document['pref_label'])
+        pref_label_ocr = normalize_ocr(document['pref_label'])
         document['pref_label_ocr'] = pref_label_ocr
         document['pref_label_str_ocr'] = pref_label_ocr
 
     if 'alt_label' in document:
-        alt_label_ocr = [utilities.normalize_ocr(label) for label in
+        alt_label_ocr = [normalize_ocr(label) for label in
                          document['alt_label']]
         document['alt_label_ocr'] = alt_label_ocr
         document['alt_label_str_ocr'] = alt_label_ocr
 
     if 'last_part' in document:
-        last_part_ocr = utilities.normalize_ocr(document['last_part'])
+        last_part_ocr = normalize_ocr(document['last_part'])
         document['last_part_ocr'] = last_part_ocr
         document['last_part_str_ocr'] = last_part_ocr
 
     # Vectors
     # Wikidata
     if 'uri_wd' in document:
-        payload = {'source': document['uri_wd'].split('/')[-1]}
-        response = requests.get(W2V_URL, params=payload, timeout=300)
-        data = response.json()
-        if data['vectors']:
-            data = [float('{0:.3f}'.format(f)) for f in data['vectors'][0]]
+        vectors = embeddings.get_vectors(document['uri_wd'].split('/')[-1])
+        if vectors:
+            data = [float('{0:.3f}'.format(f)) for f in vectors[0]]
             document['vector'] = json.dumps(data)
 
     # Abstract and keyword tokens
@@ -472,9 +547,7 @@ def transform(record, uri):
         tokens = [t for t in tokens if t not in dictionary.unwanted and
                   len(t) >= 5]
 
-        payload = {'source': ' '.join(list(set(tokens)))}
-        response = requests.get(W2V_URL, params=payload, timeout=300)
-        data = response.json()['vectors']
+        data = embeddings.get_vectors(' '.join(dict.fromkeys(tokens)))
         if data:
             document['abstract_vector'] = [json.dumps([float(
                 '{0:.3f}'.format(f)) for f in v]) for v in data]
@@ -483,31 +556,31 @@ def transform(record, uri):
 
 
 def clean_labels(cand, pref_label):
+    '''
+    Normalize the candidate alt labels, excluding unwanted candidates,
+    duplicates and labels with the same words as the pref label, in order
+    of first occurrence.
+    '''
+    pref_words = set(pref_label.split())
+    pref_len = len(pref_label.split())
 
-    alt_label = []
-
-    # Exclude some unwanted candidates
-    unwanted = ['/', '|']
-    for s in unwanted:
-        for c in cand[:]:
-            if c and c.find(s) > -1:
-                cand.remove(c)
+    # Dict used as an ordered set of normalized labels
+    alt_label = {}
 
-    # Exclude identical alt labels and alt labels identical to the pref label
-    alt_label = []
     for l in cand:
-        l_norm = utilities.normalize(remove_spec(l))
+        # Exclude some unwanted candidates
+        if l and ('/' in l or '|' in l):
+            continue
+
+        # Exclude identical alt labels and alt labels identical to the pref
+        # label
+        l_norm = normalize(remove_spec(l))
         if l_norm and l_norm != pref_label:
-            if l_norm not in alt_label:
-                alt_label.append(l_norm)
+            alt_label[l_norm] = None
 
     # Exclude alt labels that contain the same words as the pref label
-    for l in alt_label[:]:
-        if len(set(l.split()) & set(pref_label.split())) == len(l.split()):
-            if len(pref_label.split()) == len(l.split()):
-                alt_label.remove(l)
-
-    return alt_label
+    return [l for l in alt_label if not (len(l.split()) == pref_len and
+            len(set(l.split()) & pref_words) == pref_len)]
 
 
 def get_document(uri=None):
@@ -535,6 +608,49 @@ def get_document(uri=None):
     return document
 
 
+def get_documents(uris):
+    '''
+    Retrieve and process all info about the specified uris, fetching the
+    records for all of them at once. Return a dict of documents by uri,
+    leaving out the uris for which the document could not be built.
+    '''
+    # Get original records
+    records = get_records(uris)
+
+    # Check for English records if originals were Dutch
+    same_as = {}
+    for uri in uris:
+        if uri.startswith('http://nl.dbpedia.org/resource/'):
+            same_as[uri] = [u for u in records[uri].get(PROP_SAME_AS, []) if
+                            u.startswith('http://dbpedia.org/resource/')]
+
+    same_as_uris = sorted(set([u for v in same_as.values() for u in v]))
+    same_as_records = get_records(same_as_uris) if same_as_uris else {}
+
+    # Get predicted topics and types for all uris at once, if possible,
+    # falling back to retrieval for each uri in transform
+    predictions = {}
+    if topics.BATCH:
+        try:
+            predictions = topics.get_topics_batch(uris)
+        except Exception as e:
+            predictions = {}
+
+    # Merge records and transform each into a document, copying the
+    # English records as they may be shared by several Dutch ones
+    documents = {}
+    for uri in uris:
+        record = merge([records[uri]] + [
+            {k: list(v) for k, v in same_as_records[u].items()} for u in
+            same_as.get(uri, [])])
+        try:
+            documents[uri] = transform(record, uri, predictions.get(uri))
+        except Exception as e:
+            continue
+
+    return documents
+
+
 if __name__ == '__main__':
     if len(sys.argv) > 1:
         result = get_document(sys.argv[1])
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import argparse
+import array
+import os
+import tempfile
+import zlib
+
+MODES = ['contiguous', 'hash']
+
+
+def parse_shard(s):
+    '''
+    Parse a shard specification like 2/8 into a (shard, shards) tuple,
+    with shards numbered from 0.
+    '''
+    shard, shards = [int(n) for n in s.split('/')]
+    if shards < 1 or not 0 <= shard < shards:
+        raise ValueError('Invalid shard: {}'.format(s))
+    return shard, shards
+
+
+def shard_name(shard):
+    '''
+    Return a name for a (shard, shards) tuple to use in file names.
+    '''
+    return 'shard-{}-of-{}'.format(*shard)
+
+
+def shard_path(path, shard=None):
+    '''
+    Return the path of a file of which each shard needs its own copy, as
+    it cannot be written by several processes at once.
+    '''
+    if not shard:
+        return path
+    return '{}.{}'.format(path, shard_name(shard))
+
+
+def index_path(in_file):
+    '''
+    Return the path of the offset index of a plain text list.
+    '''
+    return in_file + '.idx'
+
+
+def build_index(in_file):
+    '''
+    Write the byte offset of the start of every line in a plain text list,
+    followed by the file size, to an offset index next to the list.
+    '''
+    offsets = array.array('Q', [0])
+    with open(in_file, 'rb') as fh:
+        for line in fh:
+            offsets.append(offsets[-1] + len(line))
+
+    # Write to a temporary file first, as other shard workers may be
+    # reading the index at the same time
+    path = index_path(in_file)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.',
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, 'wb') as fh:
+        offsets.tofile(fh)
+    os.replace(tmp_path, path)
+
+    return offsets
+
+
+def read_index(in_file):
+    '''
+    Read the offset index of a plain text list, building it again if it
+    is missing, older than the list or does not end at the size of the
+    list.
+    '''
+    path = index_path(in_file)
+    if (not os.path.exists(path) or
+            os.path.getmtime(path) < os.path.getmtime(in_file)):
+        return build_index(in_file)
+
+    offsets = array.array('Q')
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    offsets.frombytes(data[:len(data) - len(data) % offsets.itemsize])
+
+    if not offsets or offsets[-1] != os.path.getsize(in_file):
+        return build_index(in_file)
+    return offsets
+
+
+def get_range(in_file, shard, itemsize=0, count=0):
+    '''
+    Return the (offset, end, line) range of a contiguous shard of the
+    input list, i.e. its start and end byte offsets and its first line
+    number. Id files hold count fixed size items of itemsize bytes and
+    need no index, their offsets being relative to the first item.
+    '''
+    i, n = shard
+
+    if itemsize:
+        lines = count
+        first, last = i * lines // n, (i + 1) * lines // n
+        return first * itemsize, last * itemsize, first
+
+    offsets = read_index(in_file)
+    lines = len(offsets) - 1
+    first, last = i * lines // n, (i + 1) * lines // n
+    return offsets[first], offsets[last], first
+
+
+def in_shard(uri, shard):
+    '''
+    Check whether a uri belongs to a hash partitioned shard.
+    '''
+    i, n = shard
+    return zlib.crc32(uri.encode('utf-8')) % n == i
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('input', type=str, nargs='+',
+                        help='path to plain text uri list')
+
+    args = parser.parse_args()
+
+    for in_file in vars(args)['input']:
+        offsets = build_index(in_file)
+        print('Indexed {} lines of {}'.format(len(offsets) - 1, in_file))
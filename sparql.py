@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import itertools
+import re
+import xml.etree.ElementTree as ET
+
+# DBpedia Indexer imports
+import client
+
+FORMAT = 'xml'
+CHUNK_SIZE = 64 * 1024
+
+CHAR_REF = re.compile(b'&#([0-9]+);')
+
+
+def strip_char_refs(chunks):
+    '''
+    Remove numeric character references from a stream of byte chunks,
+    holding back a reference that may be split over two chunks.
+    '''
+    tail = b''
+    for chunk in chunks:
+        data = tail + chunk
+        i = data.rfind(b'&')
+        if i > -1 and b';' not in data[i:]:
+            data, tail = data[:i], data[i:]
+        else:
+            tail = b''
+        yield CHAR_REF.sub(b'', data)
+    if tail:
+        yield CHAR_REF.sub(b'', tail)
+
+
+def local_name(tag):
+    '''
+    Strip the namespace from an element tag.
+    '''
+    return tag.split('}')[-1]
+
+
+def parse_results(chunks):
+    '''
+    Incrementally parse a SPARQL XML result document from a stream of
+    byte chunks, yielding a dict of values by variable name for each
+    result. Parsed results are discarded right away, so memory use does
+    not grow with the number of results.
+    '''
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    results = None
+
+    # A final None closes the parser
+    for chunk in itertools.chain(strip_char_refs(chunks), [None]):
+        if chunk is None:
+            parser.close()
+        else:
+            parser.feed(chunk)
+
+        for event, elem in parser.read_events():
+            if event == 'start':
+                if local_name(elem.tag) == 'results':
+                    results = elem
+            elif local_name(elem.tag) == 'result':
+                yield {b.get('name'): b[0].text for b in elem if len(b)}
+                if results is not None:
+                    results.remove(elem)
+
+
+def select(url, query, default_graph_uri=None, method='get'):
+    '''
+    Send a SPARQL SELECT query and yield the results as they are received,
+    each as a dict of values by variable name. Unbound variables are left
+    out.
+    '''
+    payload = {
+        'format': FORMAT,
+        'query': query
+        }
+    if default_graph_uri:
+        payload['default-graph-uri'] = default_graph_uri
+
+    if method == 'post':
+        response = client.post(url, data=payload, stream=True)
+    else:
+        response = client.get(url, params=payload, stream=True)
+
+    try:
+        for binding in parse_results(response.iter_content(CHUNK_SIZE)):
+            yield binding
+    finally:
+        response.close()
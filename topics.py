@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import argparse
+import hashlib
+import http.server
+import json
+import urllib.parse
+
+# DBpedia Indexer imports
+import client
+
+TOPICS_URL = 'http://kbresearch.nl/topics/?'
+
+# Send lists of uris to the topics service in a single request
+BATCH = False
+
+# Topics and types predicted by the stand-in server
+TOPICS = ['politics', 'economy', 'culture', 'sports', 'science', 'religion']
+TYPES = ['person', 'location', 'organisation', 'other']
+
+
+def get_topics(uri):
+    '''
+    Retrieve the predicted topics and types for a uri.
+    '''
+    resp = client.get(TOPICS_URL, params={'url': uri}, timeout=300)
+    if resp.status_code != 200:
+        raise Exception('Error retrieving topics')
+
+    return resp.json()
+
+
+def get_topics_batch(uris):
+    '''
+    Retrieve the predicted topics and types for a list of uris in a single
+    request. Return a dict of predictions by uri.
+    '''
+    payload = json.dumps({'urls': uris})
+    headers = {'Content-Type': 'application/json'}
+    resp = client.post(TOPICS_URL, data=payload, headers=headers,
+                       timeout=300)
+    if resp.status_code != 200:
+        raise Exception('Error retrieving topics')
+
+    return resp.json()['results']
+
+
+def predict(uri):
+    '''
+    Return deterministic dummy predictions for a uri, for testing.
+    '''
+    def score(name):
+        digest = hashlib.md5((uri + name).encode('utf-8')).digest()
+        return int.from_bytes(digest[:4], 'little') / 2 ** 32
+
+    return {'topics': {t: score(t) for t in TOPICS},
+            'types': {t: score(t) for t in TYPES}}
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    '''
+    Stand-in for the topics service, answering single uri GET requests
+    and batch POST requests with dummy predictions.
+    '''
+
+    def send(self, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        query = urllib.parse.urlparse(self.path).query
+        uri = urllib.parse.parse_qs(query).get('url')
+        if not uri:
+            self.send_error(400, 'Missing url parameter')
+            return
+        self.send(predict(uri[0]))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            uris = json.loads(self.rfile.read(length).decode('utf-8'))['urls']
+        except Exception as e:
+            self.send_error(400, 'Invalid batch request')
+            return
+        self.send({'results': {u: predict(u) for u in uris}})
+
+
+def serve(host='localhost', port=8090):
+    '''
+    Run the stand-in topics service.
+    '''
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    print('Serving dummy topics on http://{}:{}/'.format(host, port))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--host', required=False, type=str,
+                        default='localhost', help='host to listen on')
+    parser.add_argument('--port', required=False, type=int,
+                        default=8090, help='port to listen on')
+
+    args = parser.parse_args()
+
+    serve(vars(args)['host'], vars(args)['port'])
@@ -20,15 +20,17 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 # Standard library imports
-import base64
+import copy
 import json
 import os
 import pprint
-import struct
 import sys
 
-# Third-party library imports
-import requests
+# DBpedia Indexer imports
+import client
+import embeddings
+import topics
+import vectorcodec
 
 # Import DAC modules
 sys.path.insert(0, os.path.join(*[os.path.dirname(
@@ -37,23 +39,72 @@ import dictionary
 import utilities
 
 SOLR_URL = 'http://linksolr1.kbresearch.nl/dbpedia/query?'
-TOPICS_URL = 'http://kbresearch.nl/topics/?'
-W2V_URL = 'http://kbresearch.nl/word2vec/vectors?'
 
-
-def get_current(uri):
+# Number of documents per page when streaming the index
+ROWS = 1000
+
+# Stored fields read by each action, for retrieving only those fields
+# when producing atomic updates, or None if no fields are needed
+FIELDS = {
+    'ocr': ['pref_label', 'alt_label', 'last_part'],
+    'topics': None,
+    'last_part': ['dbo_type', 'dbo_type_person', 'last_part', 'pref_label'],
+    'remove_last_part': ['dbo_type', 'last_part', 'last_part_str',
+                         'last_part_ocr', 'last_part_str_ocr'],
+    'abstract': ['abstract'],
+    'abstract_norm': ['abstract'],
+    'vectors': ['uri_wd', 'abstract_token', 'keyword', 'pref_label'],
+    'vectors_bin': ['uri_wd', 'abstract_token', 'keyword', 'pref_label'],
+    'remove_vectors_bin': None,
+    'consonants': ['pref_label', 'alt_label', 'wd_alt_label', 'last_part'],
+}
+
+# Fields that are removed unconditionally by an action
+REMOVED = {
+    'remove_vectors_bin': ['vector_bin', 'abstract_vector_bin'],
+}
+
+
+def get_current(uri, fields=None):
     payload = {}
     payload['q'] = 'id:"{}"'.format(uri)
     payload['wt'] = 'json'
+    if fields is not None:
+        payload['fl'] = ','.join(['id'] + fields)
 
-    resp = requests.get(SOLR_URL, params=payload, timeout=60).json()
+    resp = client.get(SOLR_URL, params=payload, timeout=60).json()
 
     return resp['response']['docs'][0]
 
 
-def get_document_ocr(uri):
+def iter_current(query='*:*', fields=None, rows=ROWS, cursor='*'):
+    '''
+    Yield (cursor, doc) pairs for all stored documents matching the query,
+    paging through the results with a cursor sorted on id. The cursor is
+    the one from which the page holding the document was retrieved, so
+    streaming can be resumed from there.
+    '''
+    payload = {}
+    payload['q'] = query
+    payload['wt'] = 'json'
+    payload['sort'] = 'id asc'
+    payload['rows'] = rows
+    if fields is not None:
+        payload['fl'] = ','.join(['id'] + fields)
+
+    while True:
+        payload['cursorMark'] = cursor
+        resp = client.get(SOLR_URL, params=payload, timeout=300).json()
+
+        for doc in resp['response']['docs']:
+            yield cursor, doc
+
+        if resp['nextCursorMark'] == cursor:
+            break
+        cursor = resp['nextCursorMark']
+
 
-    doc = get_current(uri)
+def update_ocr(doc):
 
     if 'pref_label' in doc:
         pref_label_ocr = utilities.normalize_ocr(doc['pref_label'])
@@ -71,15 +122,9 @@ def get_document_ocr(uri):
     return doc
 
 
-def get_document_topics(uri):
+def update_topics(doc, predictions=None):
 
-    doc = get_current(uri)
-
-    resp = requests.get(TOPICS_URL, params={'url': uri}, timeout=300)
-    if resp.status_code != 200:
-        raise Exception('Error retrieving topics')
-
-    resp = resp.json()
+    resp = predictions or topics.get_topics(doc['id'])
 
     for t in resp['topics']:
         doc['topic_{}'.format(t)] = float('{0:.3f}'.format(
@@ -92,9 +137,7 @@ def get_document_topics(uri):
     return doc
 
 
-def get_document_last_part(uri):
-
-    doc = get_current(uri)
+def update_last_part(doc):
 
     if ('dbo_type' not in doc and doc['dbo_type_person'] >= 0.75 and
             'last_part' not in doc):
@@ -113,9 +156,7 @@ def get_document_last_part(uri):
     return None
 
 
-def get_document_remove_last_part(uri):
-
-    doc = get_current(uri)
+def update_remove_last_part(doc):
 
     if ('last_part' in doc and 'dbo_type' in doc and 'Person' not in
             doc['dbo_type']):
@@ -130,9 +171,7 @@ def get_document_remove_last_part(uri):
     return None
 
 
-def get_document_abstract(uri):
-
-    doc = get_current(uri)
+def update_abstract(doc):
 
     if 'abstract' not in doc:
         doc['abstract'] = '.'
@@ -140,30 +179,26 @@ def get_document_abstract(uri):
     return doc
 
 
-def get_document_abstract_norm(uri):
-
-    doc = get_current(uri)
+def update_abstract_norm(doc):
 
     bow = utilities.tokenize(doc['abstract'], max_sent=5)
 
     doc['abstract_norm'] = ' '.join(bow)
-    doc['abstract_token'] = list(set([t for t in bow if len(t) > 5]))[:15]
+    doc['abstract_token'] = list(dict.fromkeys(
+        [t for t in bow if len(t) > 5]))[:15]
 
     return doc
 
 
-def get_document_vectors(uri):
+def update_vectors(doc):
 
-    doc = get_current(uri)
-    del doc['_version_']
+    doc.pop('_version_', None)
 
     # Wikidata
     if 'uri_wd' in doc:
-        payload = {'source': doc['uri_wd'].split('/')[-1]}
-        response = requests.get(W2V_URL, params=payload, timeout=300)
-        data = response.json()
-        if data['vectors']:
-            data = [float('{0:.3f}'.format(f)) for f in data['vectors'][0]]
+        vectors = embeddings.get_vectors(doc['uri_wd'].split('/')[-1])
+        if vectors:
+            data = [float('{0:.3f}'.format(f)) for f in vectors[0]]
             doc['vector'] = json.dumps(data)
 
     # Abstract and keyword tokens
@@ -179,9 +214,7 @@ def get_document_vectors(uri):
         tokens = [t for t in tokens if t not in dictionary.unwanted and
                   len(t) >= 5]
 
-        payload = {'source': ' '.join(list(set(tokens)))}
-        response = requests.get(W2V_URL, params=payload, timeout=300)
-        data = response.json()['vectors']
+        data = embeddings.get_vectors(' '.join(dict.fromkeys(tokens)))
         if data:
             doc['abstract_vector'] = [json.dumps([float('{0:.3f}'.format(f))
                                                   for f in v]) for v in data]
@@ -189,21 +222,16 @@ def get_document_vectors(uri):
     return doc
 
 
-def get_document_vectors_bin(uri):
+def update_vectors_bin(doc):
 
-    doc = get_current(uri)
-    del doc['_version_']
+    doc.pop('_version_', None)
 
     # Wikidata
     if 'uri_wd' in doc:
-        payload = {'source': doc['uri_wd'].split('/')[-1]}
-        response = requests.get(W2V_URL, params=payload, timeout=300)
-        data = response.json()
+        vectors = embeddings.get_vectors(doc['uri_wd'].split('/')[-1])
 
-        if data['vectors']:
-            listFloatIn = data['vectors'][0]
-            bufIn = struct.pack('!%sd' % len(listFloatIn), *listFloatIn)
-            doc['vector_bin'] = base64.b64encode(bufIn).decode('ascii')
+        if vectors:
+            doc['vector_bin'] = vectorcodec.encode(vectors[:1])[0]
 
     # Abstract and keyword tokens
     tokens = []
@@ -218,21 +246,15 @@ def get_document_vectors_bin(uri):
         tokens = [t for t in tokens if t not in dictionary.unwanted and
                   len(t) >= 5]
 
-        payload = {'source': ' '.join(list(set(tokens)))}
-        response = requests.get(W2V_URL, params=payload, timeout=300)
-        data = response.json()
+        vectors = embeddings.get_vectors(' '.join(dict.fromkeys(tokens)))
 
-        if data['vectors']:
-            doc['abstract_vector_bin'] = []
-            for v in data['vectors']:
-                bufIn = struct.pack('!%sd' % len(v), *v)
-                doc['abstract_vector_bin'].append(base64.b64encode(bufIn).decode('ascii'))
+        if vectors:
+            doc['abstract_vector_bin'] = vectorcodec.encode(vectors)
 
     return doc
 
 
-def get_document_remove_vectors_bin(uri):
-    doc = get_current(uri)
+def update_remove_vectors_bin(doc):
 
     if 'vector_bin' in doc:
         del doc['vector_bin']
@@ -247,8 +269,7 @@ def normalize_consonants(s):
     return s
 
 
-def get_document_normalize_consonants(uri):
-    doc = get_current(uri)
+def update_normalize_consonants(doc):
 
     if 'pref_label' in doc:
         doc['pref_label'] = doc['pref_label_str'] = normalize_consonants(
@@ -279,6 +300,182 @@ def get_document_normalize_consonants(uri):
     return doc
 
 
+ACTIONS = {
+    'ocr': update_ocr,
+    'topics': update_topics,
+    'last_part': update_last_part,
+    'remove_last_part': update_remove_last_part,
+    'abstract': update_abstract,
+    'abstract_norm': update_abstract_norm,
+    'vectors': update_vectors,
+    'vectors_bin': update_vectors_bin,
+    'remove_vectors_bin': update_remove_vectors_bin,
+    'consonants': update_normalize_consonants,
+}
+
+
+def apply_action(doc, action, predictions=None):
+    '''
+    Apply the transformation for an action to a stored document. Return
+    the updated document, or None if there is nothing to update.
+    '''
+    if action == 'topics':
+        return update_topics(doc, predictions)
+    return ACTIONS[action](doc)
+
+
+def apply_actions(doc, actions, predictions=None):
+    '''
+    Apply the transformations for a list of actions in sequence to a
+    stored document, each one to the result of the previous ones. Return
+    the updated document, or None if none of the actions had anything to
+    update.
+    '''
+    updated = False
+
+    for action in actions:
+        new = apply_action(doc, action, predictions)
+        if new:
+            doc = new
+            updated = True
+
+    return doc if updated else None
+
+
+def get_document(uri, actions, predictions=None):
+    '''
+    Retrieve the stored document for the URI and apply the transformations
+    for a list of actions to it.
+    '''
+    return apply_actions(get_current(uri), actions, predictions)
+
+
+def get_document_ocr(uri):
+    return get_document(uri, ['ocr'])
+
+
+def get_document_topics(uri, predictions=None):
+    return get_document(uri, ['topics'], predictions)
+
+
+def get_document_last_part(uri):
+    return get_document(uri, ['last_part'])
+
+
+def get_document_remove_last_part(uri):
+    return get_document(uri, ['remove_last_part'])
+
+
+def get_document_abstract(uri):
+    return get_document(uri, ['abstract'])
+
+
+def get_document_abstract_norm(uri):
+    return get_document(uri, ['abstract_norm'])
+
+
+def get_document_vectors(uri):
+    return get_document(uri, ['vectors'])
+
+
+def get_document_vectors_bin(uri):
+    return get_document(uri, ['vectors_bin'])
+
+
+def get_document_remove_vectors_bin(uri):
+    return get_document(uri, ['remove_vectors_bin'])
+
+
+def get_document_normalize_consonants(uri):
+    return get_document(uri, ['consonants'])
+
+
+def diff(old, new):
+    '''
+    Return a Solr atomic update setting the fields that differ between the
+    old and the new version of a document, and removing the fields that
+    are missing from the new version. Return None if nothing changed. The
+    update requires the document to exist, so that Solr does not create
+    stub documents for uris that are not in the index.
+    '''
+    fields = {}
+
+    for field in new:
+        if field != 'id' and (field not in old or new[field] != old[field]):
+            fields[field] = {'set': new[field]}
+
+    for field in old:
+        if field not in new:
+            fields[field] = {'set': None}
+
+    if not fields:
+        return None
+
+    fields['id'] = old['id']
+    fields['_version_'] = 1
+    return fields
+
+
+def get_fields(actions):
+    '''
+    Return the stored fields read or removed by a list of actions, which
+    are all an atomic update for them needs.
+    '''
+    fields = []
+
+    for action in actions:
+        for field in (FIELDS[action] or []) + REMOVED.get(action, []):
+            if field not in fields:
+                fields.append(field)
+
+    return fields
+
+
+def get_atomic_update(uri, actions, predictions=None):
+    '''
+    Produce a Solr atomic update for a list of actions, retrieving only the
+    stored fields the actions read, or nothing at all if they need none.
+    Return None if there is nothing to update. Like diff, the update only
+    applies to a document that is already in the index.
+    '''
+    if all([action in REMOVED for action in actions]):
+        fields = dict([(f, {'set': None}) for f in get_fields(actions)])
+        fields['id'] = uri
+        fields['_version_'] = 1
+        return fields
+
+    fields = get_fields(actions)
+    if not fields:
+        old = {'id': uri}
+    else:
+        old = get_current(uri, fields)
+
+    return atomic_update(old, actions, predictions)
+
+
+def atomic_update(old, actions, predictions=None):
+    '''
+    Apply a list of actions to a copy of a stored document and return the
+    atomic update for the changes, or None if there are none.
+    '''
+    new = apply_actions(copy.deepcopy(old), actions, predictions)
+    if not new:
+        return None
+
+    return diff(old, new)
+
+
+def get_stream_fields(actions, atomic=False):
+    '''
+    Return the stored fields to be streamed for a list of actions, or None
+    for all fields. Atomic updates need only the fields the actions read
+    or remove.
+    '''
+    if not atomic:
+        return None
+    return get_fields(actions)
+
+
 if __name__ == '__main__':
     if len(sys.argv) > 1:
         uri = sys.argv[1]
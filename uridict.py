@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import argparse
+import array
+import bisect
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+# DBpedia Indexer imports
+import extsort
+
+MAGIC = b'URIDICT2'
+HEADER = struct.Struct('<8sQQ16s')
+
+IDS_MAGIC = b'URIIDS01'
+IDS_HEADER = struct.Struct('<8s16sQ')
+
+
+def read_list(in_file):
+    '''
+    Yield the uris on a plain text list, as newline terminated byte
+    strings.
+    '''
+    with open(in_file, 'rb') as fh:
+        for line in fh:
+            if line.strip():
+                yield line.split()[-1] + b'\n'
+
+
+def build(in_files, out_file, tmp_dir=None, append=False):
+    '''
+    Build a dictionary of all distinct uris on the lists. Uris are stored
+    in sorted segments, their position being their id, followed by an
+    array of offsets into the string table. When appending to an existing
+    dictionary, its uris keep their ids and only the new uris are added,
+    as a new segment.
+    '''
+    base = None
+    if append and os.path.exists(out_file):
+        base = URIDict(out_file)
+
+    lines = (line for in_file in in_files for line in read_list(in_file))
+
+    offsets = array.array('Q', [0])
+    fd, strings = tempfile.mkstemp(suffix='.str', dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as fh:
+        if base:
+            offsets = array.array('Q', base.offsets)
+            for start in range(0, offsets[-1], 1024 * 1024):
+                fh.write(base.mm[base.base + start:base.base +
+                                 min(start + 1024 * 1024, offsets[-1])])
+        last = None
+        for line in extsort.sort_lines(lines, tmp_dir):
+            if line == last:
+                continue
+            last = line
+            if base and base.id(line[:-1].decode('utf-8')) is not None:
+                continue
+            fh.write(line[:-1])
+            offsets.append(offsets[-1] + len(line) - 1)
+
+    segments = array.array('Q', base.segments if base else [0])
+    if segments[-1] < len(offsets) - 1:
+        segments.append(len(offsets) - 1)
+    lineage = base.lineage if base else os.urandom(16)
+
+    if base:
+        base.close()
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(
+        os.path.abspath(out_file)))
+    with os.fdopen(fd, 'wb') as fh:
+        fh.write(HEADER.pack(MAGIC, len(offsets) - 1, len(segments) - 1,
+                             lineage))
+        segments.tofile(fh)
+        offsets.tofile(fh)
+        with open(strings, 'rb') as sh:
+            while True:
+                data = sh.read(1024 * 1024)
+                if not data:
+                    break
+                fh.write(data)
+
+    os.replace(tmp_path, out_file)
+    os.remove(strings)
+
+
+class URIDict(object):
+    '''
+    Read-only, memory-mapped uri dictionary mapping uris to integer ids
+    and back. Ids never change when uris are appended to the dictionary.
+    The lineage identifies a dictionary and the ones appended to it.
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            self.mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, n, k, self.lineage = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise Exception('Not a uri dictionary: {}'.format(path))
+
+        start = HEADER.size
+        self.segments = memoryview(self.mm)[start:start + 8 * (k + 1)].cast(
+            'Q')
+        start += 8 * (k + 1)
+        self.offsets = memoryview(self.mm)[start:start + 8 * (n + 1)].cast(
+            'Q')
+        self.base = start + 8 * (n + 1)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.mm[self.base + self.offsets[i]:
+                       self.base + self.offsets[i + 1]]
+
+    def uri(self, i):
+        '''
+        Return the uri with the specified id.
+        '''
+        return self[i].decode('utf-8')
+
+    def id(self, uri):
+        '''
+        Return the id of the specified uri, or None if it is unknown.
+        '''
+        key = uri.encode('utf-8')
+        for lo, hi in zip(self.segments[:-1], self.segments[1:]):
+            i = bisect.bisect_left(self, key, lo, hi)
+            if i < hi and self[i] == key:
+                return i
+        return None
+
+    def close(self):
+        self.segments.release()
+        self.offsets.release()
+        self.mm.close()
+
+
+def open_dict(path):
+    '''
+    Open a uri dictionary for lookups.
+    '''
+    return URIDict(path)
+
+
+def encode(in_file, uri_dict):
+    '''
+    Return a plain text uri list as an array of uri ids.
+    '''
+    ids = array.array('I')
+    for line in read_list(in_file):
+        i = uri_dict.id(line[:-1].decode('utf-8'))
+        if i is None:
+            raise Exception('Uri not in dictionary: {}'.format(line))
+        ids.append(i)
+    return ids
+
+
+def encode_list(in_file, out_file, uri_dict):
+    '''
+    Encode a plain text uri list as an id file.
+    '''
+    write_ids(encode(in_file, uri_dict), out_file, uri_dict)
+
+
+def decode_list(in_file, out_file, uri_dict):
+    '''
+    Decode an id file into a plain text uri list.
+    '''
+    with open(out_file, 'wb') as fh:
+        for i in read_ids(in_file, uri_dict):
+            fh.write(uri_dict[i] + b'\n')
+
+
+def read_ids(in_file, uri_dict=None):
+    '''
+    Read an id file as an array of uri ids. If a dictionary is given,
+    check that the ids were encoded with it or with a dictionary it was
+    appended to.
+    '''
+    ids = array.array('I')
+    with open(in_file, 'rb') as fh:
+        magic, lineage, size = IDS_HEADER.unpack(fh.read(IDS_HEADER.size))
+        if magic != IDS_MAGIC:
+            raise Exception('Not an id file: {}'.format(in_file))
+        if uri_dict is not None and (lineage != uri_dict.lineage or
+                                     size > len(uri_dict)):
+            raise Exception('Id file {} was not encoded with this '
+                            'dictionary'.format(in_file))
+        ids.frombytes(fh.read())
+    return ids
+
+
+def count_ids(in_file):
+    '''
+    Return the number of ids in an id file without reading it.
+    '''
+    return (os.path.getsize(in_file) - IDS_HEADER.size) // 4
+
+
+def write_ids(ids, out_file, uri_dict):
+    '''
+    Write an array of uri ids to an id file, with the lineage and size of
+    the dictionary they belong to.
+    '''
+    with open(out_file, 'wb') as fh:
+        fh.write(IDS_HEADER.pack(IDS_MAGIC, uri_dict.lineage,
+                                 len(uri_dict)))
+        array.array('I', ids).tofile(fh)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--dict', required=False, type=str,
+                        default='uris.dict', help='path to uri dictionary')
+    parser.add_argument('--build', required=False, type=str, nargs='+',
+                        default=None, help='build dictionary from uri lists')
+    parser.add_argument('--append', required=False, action='store_true',
+                        help='add new uris to the existing dictionary, '
+                        'keeping the ids of known uris')
+    parser.add_argument('--encode', required=False, type=str, nargs=2,
+                        default=None, help='encode uri list as id file')
+    parser.add_argument('--decode', required=False, type=str, nargs=2,
+                        default=None, help='decode id file as uri list')
+    parser.add_argument('--tmp', required=False, type=str,
+                        default=None, help='directory for sorted runs')
+
+    args = parser.parse_args()
+
+    if vars(args)['build']:
+        build(vars(args)['build'], vars(args)['dict'], vars(args)['tmp'],
+              vars(args)['append'])
+    elif vars(args)['encode']:
+        encode_list(vars(args)['encode'][0], vars(args)['encode'][1],
+                    open_dict(vars(args)['dict']))
+    elif vars(args)['decode']:
+        decode_list(vars(args)['decode'][0], vars(args)['decode'][1],
+                    open_dict(vars(args)['dict']))
+    else:
+        parser.print_help()
+        sys.exit(1)
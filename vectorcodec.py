@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import argparse
+import base64
+
+# Third-party library imports
+import numpy as np
+
+# Binary vector encodings, all big-endian. The float64 encoding is the
+# original one, without a header. The int8 encoding starts with a float32
+# scale factor, by which the int8 values are multiplied when decoding.
+# For a given dimension the encodings differ in size (except float16 and
+# int8 for dimension 4), which identifies the codec of an encoded vector.
+CODECS = {
+    'float64': np.dtype('>f8'),
+    'float32': np.dtype('>f4'),
+    'float16': np.dtype('>f2'),
+    'int8': np.dtype('i1'),
+}
+SCALE_DTYPE = np.dtype('>f4')
+
+# Encoding used for vector_bin and abstract_vector_bin, set from the
+# command line
+CODEC = 'float64'
+
+
+def pack(vectors, codec=None):
+    '''
+    Pack a batch of vectors into a matrix of bytes, one row per vector.
+    '''
+    codec = codec or CODEC
+    matrix = np.asarray(vectors, dtype=np.float64)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+
+    if codec != 'int8':
+        return matrix.astype(CODECS[codec]).view(np.uint8).reshape(
+            len(matrix), -1)
+
+    # Scale each vector to the int8 range by its maximum absolute value
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    values = np.rint(matrix / scales[:, None]).astype(CODECS['int8'])
+    return np.hstack([
+        scales.astype(SCALE_DTYPE).view(np.uint8).reshape(len(matrix), -1),
+        values.view(np.uint8)])
+
+
+def encode(vectors, codec=None):
+    '''
+    Encode a batch of vectors as a list of base64 strings.
+    '''
+    return [base64.b64encode(row.tobytes()).decode('ascii') for row in
+            pack(vectors, codec)]
+
+
+def get_size(codec, dim):
+    '''
+    Return the number of bytes of an encoded vector of dimension dim.
+    '''
+    size = dim * CODECS[codec].itemsize
+    if codec == 'int8':
+        size += SCALE_DTYPE.itemsize
+    return size
+
+
+def infer_codec(size, dim):
+    '''
+    Infer the codec of an encoded vector of known dimension from its size
+    in bytes, so that vectors encoded with different codecs can be read
+    side by side.
+    '''
+    codecs = [c for c in sorted(CODECS) if get_size(c, dim) == size]
+    if len(codecs) != 1:
+        raise ValueError('Cannot infer codec of {} bytes for dimension '
+                         '{}'.format(size, dim))
+    return codecs[0]
+
+
+def decode(s, codec=None, dim=None):
+    '''
+    Decode a base64 string produced by encode into a float vector. If the
+    dimension of the vectors is given instead of the codec, the codec is
+    inferred from the size of the encoded vector.
+    '''
+    data = base64.b64decode(s)
+    if codec is None and dim is not None:
+        codec = infer_codec(len(data), dim)
+    codec = codec or CODEC
+
+    if codec != 'int8':
+        return np.frombuffer(data, dtype=CODECS[codec]).astype(np.float64)
+
+    size = SCALE_DTYPE.itemsize
+    scale = np.frombuffer(data[:size], dtype=SCALE_DTYPE)[0]
+    values = np.frombuffer(data[size:], dtype=CODECS['int8'])
+    return values.astype(np.float64) * scale
+
+
+def decode_batch(strings, codec=None, dim=None):
+    '''
+    Decode a list of base64 strings produced by encode into a matrix.
+    '''
+    return np.vstack([decode(s, codec, dim) for s in strings])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('strings', type=str, nargs='+',
+                        help='base64 encoded vectors')
+    parser.add_argument('--codec', required=False, type=str,
+                        default=None, choices=sorted(CODECS),
+                        help='vector encoding, defaults to float64 unless '
+                        'inferred from the dimension')
+    parser.add_argument('--dim', required=False, type=int,
+                        default=None,
+                        help='vector dimension, to infer the encoding of '
+                        'each vector from its size')
+
+    args = parser.parse_args()
+
+    for s in vars(args)['strings']:
+        print(decode(s, vars(args)['codec'], vars(args)['dim']).tolist())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# DBpedia indexer
+#
+# Copyright (C) 2017 Koninklijke Bibliotheek, National Library of
+# the Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+# Standard library imports
+import argparse
+import bz2
+import dbm
+import gzip
+import json
+import sys
+import threading
+
+# DBpedia Indexer imports
+import client
+
+WD_URL = 'https://www.wikidata.org/wiki/Special:EntityData/{}.json'
+LANG = 'nl'
+
+
+def get_aliases(entity, lang=LANG):
+    '''
+    Extract the alias values in the specified language from a Wikidata
+    entity dict.
+    '''
+    aliases = (entity.get('aliases') or {}).get(lang) or []
+    return [a.get('value') for a in aliases]
+
+
+def fetch_aliases(wd_id, lang=LANG):
+    '''
+    Get the aliases for a Wikidata id from the Wikidata web service. Raise
+    an exception if the service could not be reached.
+    '''
+    response = client.get(WD_URL.format(wd_id), timeout=10)
+    data = response.json()
+    entity = (data.get('entities') or {}).get(wd_id)
+    if not entity:
+        return []
+    return get_aliases(entity, lang)
+
+
+def open_dump(dump_file):
+    '''
+    Open a, possibly compressed, Wikidata JSON dump for reading.
+    '''
+    if dump_file.endswith('.gz'):
+        return gzip.open(dump_file, 'rb')
+    if dump_file.endswith('.bz2'):
+        return bz2.open(dump_file, 'rb')
+    return open(dump_file, 'rb')
+
+
+def load_dump(dump_file, out_file, lang=LANG):
+    '''
+    Load the aliases of all entities in a Wikidata JSON dump, one entity
+    per line, into an alias store. Entities without aliases are stored as
+    well, so that they are not looked up online later on.
+    '''
+    with open_dump(dump_file) as fh, dbm.open(out_file, 'n') as db:
+        for i, line in enumerate(fh):
+            line = line.strip().rstrip(b',')
+            if not line or line in [b'[', b']']:
+                continue
+
+            entity = json.loads(line.decode('utf-8'))
+            db[entity['id'].encode('utf-8')] = json.dumps(
+                get_aliases(entity, lang), ensure_ascii=False)
+
+            if i % 1000000 == 0:
+                print('Loaded entity {}: {}'.format(i, entity['id']))
+
+
+class AliasStore(object):
+    '''
+    Alias lookups in a store loaded from a Wikidata dump, backed by a
+    read-through cache for entities that were not in the dump.
+    '''
+
+    def __init__(self, path, cache_path=None, lang=LANG):
+        self.db = dbm.open(path, 'r')
+        self.cache = dbm.open(cache_path or path + '.cache', 'c')
+        self.lang = lang
+        self.lock = threading.Lock()
+
+    def get(self, wd_id):
+        '''
+        Return the aliases for a Wikidata id. Raise an exception if the id
+        is unknown and the web service could not be reached.
+        '''
+        key = wd_id.encode('utf-8')
+
+        with self.lock:
+            if key in self.db:
+                return json.loads(self.db[key].decode('utf-8'))
+            if key in self.cache:
+                return json.loads(self.cache[key].decode('utf-8'))
+
+        aliases = fetch_aliases(wd_id, self.lang)
+
+        with self.lock:
+            self.cache[key] = json.dumps(aliases, ensure_ascii=False)
+
+        return aliases
+
+
+def open_store(path, cache_path=None):
+    '''
+    Open an alias store for lookups.
+    '''
+    return AliasStore(path, cache_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--dump', required=False, type=str,
+                        default=None, help='path to Wikidata JSON dump')
+    parser.add_argument('--output', required=False, type=str,
+                        default='wd_aliases.db', help='path to alias store')
+    parser.add_argument('--lang', required=False, type=str,
+                        default=LANG, help='alias language')
+    parser.add_argument('--show', required=False, type=str,
+                        default=None, help='print the aliases for Wikidata id')
+
+    args = parser.parse_args()
+
+    if vars(args)['show']:
+        store = open_store(vars(args)['output'])
+        print(store.get(vars(args)['show']))
+        sys.exit()
+
+    if not vars(args)['dump']:
+        parser.print_help()
+        sys.exit(1)
+
+    load_dump(vars(args)['dump'], vars(args)['output'], vars(args)['lang'])